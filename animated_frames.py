@@ -0,0 +1,148 @@
+import queue
+import threading
+from collections import deque
+
+# Output formats written as animations when the source has several frames
+ANIMATED_FORMATS = ('GIF', 'WEBP')
+# Frames decoded and handed to the render workers at a time
+ANIMATION_CHUNK_FRAMES = 8
+# Seconds between checks, while a frame queue is full, for an encoder that stopped reading
+FEED_POLL_SECONDS = 0.1
+
+_END_OF_FRAMES = object()
+
+
+def webp_frame_durations(file):
+    """Per-frame durations (ms) from the ANMF chunks of an animated WebP, read without decoding"""
+    file.seek(0)
+    header = file.read(12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WEBP':
+        return []
+
+    durations = []
+    while True:
+        chunk = file.read(8)
+        if len(chunk) < 8:
+            break
+        size = int.from_bytes(chunk[4:8], 'little')
+        padded = size + (size & 1)
+        if chunk[:4] == b'ANMF' and size >= 16:
+            frame_header = file.read(16)
+            durations.append(int.from_bytes(frame_header[12:15], 'little'))
+            padded -= len(frame_header)
+        file.seek(padded, 1)
+    return durations
+
+
+def iter_frames(source):
+    """Decode the frames of an animated image in order, each a copy carrying its own info"""
+    for index in range(source.n_frames):
+        source.seek(index)
+        frame = source.copy()
+        frame.info = dict(source.info)
+        yield frame
+
+
+def iter_rendered(frames, render_frame, executor=None, chunk_frames=ANIMATION_CHUNK_FRAMES):
+    """Yield render_frame(frame) for each frame in order.
+
+    With an executor up to two chunks of frames are rendered ahead of the
+    consumer; without one each frame is rendered inline as it is asked for.
+    """
+    if executor is None:
+        for frame in frames:
+            yield render_frame(frame)
+        return
+
+    pending = deque()
+    for frame in frames:
+        pending.append(executor.submit(render_frame, frame))
+        if len(pending) >= 2 * max(1, chunk_frames):
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class _FrameFeed:
+    """Bounded hand-over of frames from the decoding thread to one encoder thread"""
+
+    def __init__(self, max_frames):
+        self.done = threading.Event()
+        self._queue = queue.Queue(max(1, max_frames))
+
+    def put(self, item):
+        """Queue a frame (or the end marker) unless the encoder has stopped reading"""
+        while not self.done.is_set():
+            try:
+                self._queue.put(item, timeout=FEED_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_FRAMES:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+def encode_streams(frame_sets, encoders, buffer_frames=ANIMATION_CHUNK_FRAMES):
+    """Feed a single pass over an animation to several encoders at once.
+
+    frame_sets yields one tuple per source frame holding a frame for each
+    encoder. encoders[i](first, rest) is called with encoder i's first frame
+    and a generator over the rest, to hand to Image.save(save_all=True,
+    append_images=rest). With several encoders each runs on its own thread
+    behind a queue of at most buffer_frames frames, so the source is decoded
+    and rendered once. Returns one entry per encoder: None, or the exception
+    it raised. An error while producing frames is raised to every encoder
+    still reading.
+    """
+    errors = [None] * len(encoders)
+    if len(encoders) == 1:
+        try:
+            _encode(encoders[0], (frame_set[0] for frame_set in frame_sets))
+        except Exception as e:
+            errors[0] = e
+        return errors
+
+    feeds = [_FrameFeed(buffer_frames) for _ in encoders]
+
+    def run(index):
+        try:
+            _encode(encoders[index], iter(feeds[index]))
+        except Exception as e:
+            errors[index] = e
+        finally:
+            feeds[index].done.set()
+
+    threads = [threading.Thread(target=run, args=(index,), name=f'wm-encode-{index}', daemon=True)
+               for index in range(len(encoders))]
+    for thread in threads:
+        thread.start()
+
+    end = _END_OF_FRAMES
+    try:
+        for frame_set in frame_sets:
+            for feed, frame in zip(feeds, frame_set):
+                feed.put(frame)
+            if all(feed.done.is_set() for feed in feeds):
+                break
+    except Exception as e:
+        end = e
+    finally:
+        for feed in feeds:
+            feed.put(end)
+        for thread in threads:
+            thread.join()
+    return errors
+
+
+def _encode(encoder, frames):
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("animation has no frames")
+    encoder(first, frames)
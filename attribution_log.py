@@ -0,0 +1,91 @@
+import atexit
+import csv
+import os
+import threading
+
+LOG_FIELDNAMES = ['timestamp', 'input_file', 'output_file', 'subfolder',
+                  'team_name', 'caption', 'photographer', 'original_size',
+                  'final_size', 'size_changed']
+
+
+class AttributionLogWriter:
+    """Keep an attribution log CSV open for a whole run and append rows in batches.
+
+    Rows are buffered and written when flush_rows rows are pending or flush_interval
+    seconds have passed since the first pending row. The writer is thread-safe, so
+    several worker threads can share it; worker processes send their rows to the
+    parent (see BatchProcessor), which owns the single writer for each log file.
+    Pending rows are flushed on close(), which also runs at interpreter exit.
+    """
+
+    def __init__(self, log_path, flush_rows=100, flush_interval=2.0):
+        self.log_path = log_path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._timer = None
+        self._closed = False
+
+        needs_header = not os.path.exists(log_path) or os.path.getsize(log_path) == 0
+        self._file = open(log_path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=LOG_FIELDNAMES)
+        if needs_header:
+            self._writer.writeheader()
+            self._file.flush()
+
+        atexit.register(self.close)
+
+    def write_row(self, row):
+        """Queue one row for writing"""
+        self.write_rows([row])
+
+    def write_rows(self, rows):
+        """Queue several rows for writing, flushing if the buffer is full"""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Attribution log is closed: {self.log_path}")
+
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+            elif self._buffer and self._timer is None:
+                # Make sure a quiet period doesn't leave rows sitting in memory
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write all pending rows to disk"""
+        with self._lock:
+            if not self._closed:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+        """Flush pending rows and close the file; safe to call more than once"""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._file.close()
+            self._closed = True
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
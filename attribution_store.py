@@ -0,0 +1,267 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+INDEX_VERSION = 1
+# CSVs at least this large are indexed in SQLite instead of being held in memory
+INDEX_THRESHOLD_BYTES = 4 * 1024 * 1024
+ATTRIBUTION_FIELDS = ('team_name', 'caption', 'photographer')
+# Duplicate and ambiguous keys kept for reporting
+MAX_REPORTED_KEYS = 100
+
+
+def normalize_key(path):
+    """Lowercase posix form of a relative path or file name, as used for lookups"""
+    key = str(path).replace('\\', '/').strip().lower()
+    while key.startswith('./'):
+        key = key[2:]
+    return key.lstrip('/')
+
+
+def default_index_path(csv_path):
+    """Index file next to the CSV, or in the temp folder when that folder is read-only"""
+    csv_path = os.path.abspath(csv_path)
+    if os.access(os.path.dirname(csv_path), os.W_OK):
+        return csv_path + '.index.sqlite'
+    digest = hashlib.sha1(csv_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"triyog_attribution_{digest}.sqlite")
+
+
+class AttributionStore:
+    """Attribution rows from a CSV, looked up by relative path with a file name fallback.
+
+    The CSV 'filename' column holds either a bare file name or a path relative to
+    the input folder (e.g. 'alice/IMG_0001.jpg'). lookup() tries the relative
+    path first, then a bare file name row. Only a lookup by file name alone (no
+    relative path) falls back to the path row with that name, and only if there
+    is exactly one: an image in another folder must not take its attribution.
+    Small CSVs are held in memory; large ones (or any with use_index=True) are
+    indexed once into a SQLite file and queried from disk, so every worker
+    process opens the index instead of parsing the CSV.
+    The index is rebuilt only when the CSV's size or mtime changes, and
+    refresh() reloads a CSV that changed since it was loaded.
+
+    duplicates lists keys defined by more than one row (the last row wins) and
+    ambiguous lists file names shared by several path rows with no bare row.
+    """
+
+    def __init__(self):
+        self.csv_path = None
+        self.use_index = None
+        self.index_path = None
+        self.duplicates = []
+        self.ambiguous = []
+
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._path_keys_by_name = {}
+        self._db = None
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def load(self, csv_path, use_index=None, index_path=None):
+        """Load a CSV, indexing it on disk when use_index is True (or None and the CSV is large)"""
+        self.clear()
+        self.csv_path = str(csv_path)
+        self.use_index = use_index
+        self.index_path = index_path
+        self._load()
+        return self._count
+
+    def refresh(self):
+        """Reload the CSV if it changed on disk since it was loaded; returns True if it did"""
+        if not self.csv_path:
+            return False
+        try:
+            stamp = self._csv_stamp()
+        except OSError:
+            return False
+        if stamp == self._stamp:
+            return False
+
+        csv_path, use_index, index_path = self.csv_path, self.use_index, self.index_path
+        self.load(csv_path, use_index, index_path)
+        return True
+
+    def clear(self):
+        """Forget the loaded CSV"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+        self.csv_path = None
+        self.duplicates = []
+        self.ambiguous = []
+        self._stamp = None
+        self._entries = {}
+        self._path_keys_by_name = {}
+        self._count = 0
+
+    def report(self):
+        """Counts plus the duplicate and ambiguous keys found while indexing"""
+        return {
+            'entries': self._count,
+            'indexed': self._db is not None,
+            'duplicates': list(self.duplicates),
+            'ambiguous': list(self.ambiguous)
+        }
+
+    def lookup(self, relative_path=None, filename=None):
+        """Return the attribution for an image, or {} when the CSV has none"""
+        keys = []
+        if relative_path:
+            keys.append(normalize_key(relative_path))
+        name = normalize_key(filename) if filename else (keys[0].rsplit('/', 1)[-1] if keys else None)
+        if name and name not in keys:
+            keys.append(name)
+
+        if self._db is not None:
+            return self._lookup_index(keys, None if relative_path else name)
+
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+        if relative_path:
+            return {}
+        path_keys = self._path_keys_by_name.get(name)
+        if path_keys and len(path_keys) == 1:
+            return self._entries[path_keys[0]]
+        return {}
+
+    def _csv_stamp(self):
+        stat = os.stat(self.csv_path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _load(self):
+        stamp = self._csv_stamp()
+        use_index = self.use_index
+        if use_index is None:
+            use_index = stamp[0] >= INDEX_THRESHOLD_BYTES
+
+        if use_index:
+            self.index_path = self.index_path or default_index_path(self.csv_path)
+            if not self._open_index(stamp):
+                self._build_index(stamp)
+                if not self._open_index(stamp):
+                    raise RuntimeError(f"Could not open attribution index {self.index_path}")
+        else:
+            self._load_memory()
+        self._stamp = stamp
+
+    def _iter_rows(self):
+        """Yield (key, is_path, entry) per CSV row, recording duplicate and ambiguous keys"""
+        seen = set()
+        duplicates = []
+        bare_names = set()
+        path_names = {}
+
+        with open(self.csv_path, 'r', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                key = normalize_key(row.get('filename') or '')
+                if not key:
+                    continue
+                if key in seen:
+                    if len(duplicates) < MAX_REPORTED_KEYS:
+                        duplicates.append(key)
+                else:
+                    seen.add(key)
+
+                is_path = '/' in key
+                name = key.rsplit('/', 1)[-1]
+                if is_path:
+                    path_names.setdefault(name, set()).add(key)
+                else:
+                    bare_names.add(name)
+
+                yield key, is_path, {field: row.get(field, '') for field in ATTRIBUTION_FIELDS}
+
+        self.duplicates = sorted(set(duplicates))
+        self.ambiguous = sorted(name for name, keys in path_names.items()
+                                if len(keys) > 1 and name not in bare_names)[:MAX_REPORTED_KEYS]
+
+    def _load_memory(self):
+        entries = {}
+        path_keys_by_name = {}
+        for key, is_path, entry in self._iter_rows():
+            entries[key] = entry
+            if is_path:
+                keys = path_keys_by_name.setdefault(key.rsplit('/', 1)[-1], [])
+                if key not in keys:
+                    keys.append(key)
+
+        self._entries = entries
+        self._path_keys_by_name = path_keys_by_name
+        self._count = len(entries)
+
+    def _build_index(self, stamp):
+        """Parse the CSV into a fresh SQLite file and atomically move it into place"""
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        db = sqlite3.connect(temp_path)
+        try:
+            db.execute("CREATE TABLE rows (key TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                       "is_path INTEGER NOT NULL, team_name TEXT, caption TEXT, photographer TEXT)")
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, key.rsplit('/', 1)[-1], int(is_path), entry['team_name'], entry['caption'],
+                  entry['photographer']) for key, is_path, entry in self._iter_rows()))
+            db.execute("CREATE INDEX rows_name ON rows (name, is_path)")
+            db.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ('version', str(INDEX_VERSION)),
+                ('csv_stamp', json.dumps(list(stamp))),
+                ('duplicates', json.dumps(self.duplicates)),
+                ('ambiguous', json.dumps(self.ambiguous))
+            ])
+            db.commit()
+        finally:
+            db.close()
+        os.replace(temp_path, self.index_path)
+
+    def _open_index(self, stamp):
+        """Open an existing index if it was built from this exact CSV"""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            db = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True, check_same_thread=False)
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            if meta.get('version') != str(INDEX_VERSION) or json.loads(meta.get('csv_stamp', '[]')) != list(stamp):
+                db.close()
+                return False
+        except sqlite3.Error:
+            return False
+
+        self.duplicates = json.loads(meta.get('duplicates', '[]'))
+        self.ambiguous = json.loads(meta.get('ambiguous', '[]'))
+        self._count = db.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+        with self._lock:
+            self._db = db
+        return True
+
+    def _lookup_index(self, keys, name):
+        """Rows for keys in order, then the single path row called name (if name is given)"""
+        columns = "team_name, caption, photographer"
+        with self._lock:
+            for key in keys:
+                row = self._db.execute(f"SELECT {columns} FROM rows WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return dict(zip(ATTRIBUTION_FIELDS, row))
+            if not name:
+                return {}
+
+            rows = self._db.execute(f"SELECT {columns} FROM rows WHERE name = ? AND is_path = 1 LIMIT 2",
+                                    (name,)).fetchall()
+        if len(rows) == 1:
+            return dict(zip(ATTRIBUTION_FIELDS, rows[0]))
+        return {}
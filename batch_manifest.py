@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_FILENAME = '.watermark_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the SHA-1 hex digest of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_settings(settings):
+    """Return a stable digest of the settings that affect an output"""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class BatchManifest:
+    """Record of processed sources, used to skip unchanged images on later runs.
+
+    Each entry is keyed by the source path relative to the input folder and holds
+    the source's size, mtime and content hash, the fingerprint of the settings it
+    was rendered with and the outputs it produced. A source counts as unchanged
+    only while its size and mtime both match. The manifest is saved every few
+    entries as well as on close, so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, manifest_path, save_every=25, save_interval=5.0):
+        self.manifest_path = str(manifest_path)
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self.entries = {}
+
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        self._load()
+
+    def _load(self):
+        """Read an existing manifest, starting empty if it is missing or unreadable"""
+        if not os.path.exists(self.manifest_path):
+            return
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('entries', {})
+        except Exception as e:
+            print(f"Error loading manifest, reprocessing everything: {e}")
+            self.entries = {}
+
+    def is_current(self, key, source_path, fingerprint, output_paths):
+        """Check whether a source was already rendered with the same inputs and settings"""
+        entry = self.entries.get(key)
+        if not entry or entry.get('settings') != fingerprint:
+            return False
+
+        if sorted(entry.get('outputs', [])) != sorted(output_paths):
+            return False
+        if not all(os.path.exists(path) for path in output_paths):
+            return False
+
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return False
+
+        # A touched source is rendered again, even if its contents look the same
+        return stat.st_size == entry.get('size') and stat.st_mtime_ns == entry.get('mtime_ns')
+
+    def record(self, key, source_info, fingerprint, output_paths):
+        """Remember a successfully processed source"""
+        self.entries[key] = {
+            'size': source_info['size'],
+            'mtime_ns': source_info['mtime_ns'],
+            'sha1': source_info['sha1'],
+            'settings': fingerprint,
+            'outputs': sorted(output_paths)
+        }
+        self._mark_dirty()
+
+    def forget(self, key):
+        """Drop a source so it is processed again next time"""
+        if self.entries.pop(key, None) is not None:
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        self._unsaved += 1
+        if (self._unsaved >= self.save_every or
+                time.monotonic() - self._last_save >= self.save_interval):
+            self.save()
+
+    def save(self):
+        """Atomically write the manifest to disk"""
+        temp_path = self.manifest_path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, file)
+            os.replace(temp_path, self.manifest_path)
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+        except Exception as e:
+            print(f"Error saving manifest: {e}")
+
+    def close(self):
+        """Save any entries recorded since the last save"""
+        if self._unsaved:
+            self.save()
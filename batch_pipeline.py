@@ -0,0 +1,174 @@
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from output_sinks import FileSystemSink
+
+# Queue depths sampled while the pipeline runs, in stage order
+DEPTH_KEYS = ('read', 'render_queue', 'render', 'write', 'inflight_mb')
+
+_FILESYSTEM_SINK = FileSystemSink()
+
+
+def read_source(path, with_hash=False):
+    """Read-ahead stage: load a source file along with its size and mtime.
+
+    The content hash is only added with with_hash, for tasks a manifest records.
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as file:
+        data = file.read()
+    source_info = {'size': len(data), 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        source_info['sha1'] = hashlib.sha1(data).hexdigest()
+    return data, source_info
+
+
+def write_outputs(results, sinks=None):
+    """Write-behind stage: save the encoded outputs of one image, failing results individually.
+
+    sinks optionally maps each mode to the sink (e.g. an archive) its outputs go
+    to; without one they are written as files.
+    """
+    for result in results:
+        data = result.pop('data', None)
+        if not result['success'] or data is None:
+            continue
+
+        try:
+            sink = sinks[result['mode']] if sinks else _FILESYSTEM_SINK
+            sink.write(result['output_path'], data)
+        except Exception as e:
+            result['success'] = False
+            result['error'] = str(e)
+            result.pop('log_row', None)
+            print(f"Error writing {result['output_path']}: {e}")
+    return results
+
+
+class StagedPipeline:
+    """Run tasks through read -> render/encode -> write stages with bounded queues.
+
+    Reads and writes run on small thread pools so disk I/O overlaps rendering;
+    submit_render(task) hands a task (with its file contents in task['source'])
+    to the render/encode workers and returns a future of its result record.
+    Source and encoded bytes held by the pipeline are capped at
+    max_inflight_bytes: no new file is read while the cap would be exceeded,
+    although a single file larger than the cap is still let through on its own.
+    sinks is passed on to write_outputs() to send outputs somewhere other than
+    their own files.
+    """
+
+    def __init__(self, submit_render, on_error, max_render_pending=4, read_threads=4,
+                 write_threads=2, max_inflight_bytes=256 * 1024 * 1024, sinks=None):
+        self.submit_render = submit_render
+        self.on_error = on_error
+        self.max_render_pending = max(1, max_render_pending)
+        self.read_threads = max(1, read_threads)
+        self.write_threads = max(1, write_threads)
+        self.max_inflight_bytes = max_inflight_bytes
+        self.sinks = sinks
+
+        self.inflight_bytes = 0
+        self._depth_max = {key: 0 for key in DEPTH_KEYS}
+        self._depth_total = {key: 0.0 for key in DEPTH_KEYS}
+        self._samples = 0
+
+    def depth_stats(self):
+        """Max and mean queue depth per stage over the run"""
+        samples = max(1, self._samples)
+        return {key: {'max': self._depth_max[key], 'mean': self._depth_total[key] / samples}
+                for key in DEPTH_KEYS}
+
+    def _sample(self, depths):
+        self._samples += 1
+        for key, value in depths.items():
+            self._depth_max[key] = max(self._depth_max[key], value)
+            self._depth_total[key] += value
+
+    def _fits(self, cost):
+        return self.inflight_bytes == 0 or self.inflight_bytes + cost <= self.max_inflight_bytes
+
+    def run(self, tasks):
+        """Yield a result record per task as its outputs are written, in completion order"""
+        task_iter = iter(tasks)
+        next_task = next(task_iter, None)
+        render_queue = deque()
+        pending = {}
+        counts = {'read': 0, 'render': 0, 'write': 0}
+
+        with ThreadPoolExecutor(self.read_threads, thread_name_prefix='wm-read') as readers, \
+                ThreadPoolExecutor(self.write_threads, thread_name_prefix='wm-write') as writers:
+            while True:
+                # Read ahead while the byte budget and the render queue allow it
+                while (next_task is not None and
+                       counts['read'] + len(render_queue) < self.max_render_pending):
+                    try:
+                        cost = os.path.getsize(next_task['path'])
+                    except OSError:
+                        cost = 0
+                    if not self._fits(cost):
+                        break
+
+                    self.inflight_bytes += cost
+                    counts['read'] += 1
+                    read = readers.submit(read_source, next_task['path'], next_task.get('track_source', False))
+                    pending[read] = ('read', next_task, cost)
+                    next_task = next(task_iter, None)
+
+                while render_queue and counts['render'] < self.max_render_pending:
+                    task, cost = render_queue.popleft()
+                    counts['render'] += 1
+                    pending[self.submit_render(task)] = ('render', task, cost)
+
+                if not pending:
+                    break
+
+                depths = {
+                    'read': counts['read'],
+                    'render_queue': len(render_queue),
+                    'render': counts['render'],
+                    'write': counts['write'],
+                    'inflight_mb': self.inflight_bytes / (1024 * 1024)
+                }
+                self._sample(depths)
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, item, cost = pending.pop(future)
+                    counts[stage] -= 1
+
+                    if stage == 'read':
+                        try:
+                            item['source'], item['source_info'] = future.result()
+                        except Exception as e:
+                            self.inflight_bytes -= cost
+                            yield self.on_error(item, e)
+                            continue
+                        render_queue.append((item, cost))
+
+                    elif stage == 'render':
+                        # The source bytes are no longer needed once rendered
+                        item.pop('source', None)
+                        self.inflight_bytes -= cost
+                        try:
+                            record = future.result()
+                        except Exception as e:
+                            yield self.on_error(item, e)
+                            continue
+
+                        output_bytes = sum(len(result.get('data') or b'') for result in record['results'])
+                        self.inflight_bytes += output_bytes
+                        counts['write'] += 1
+                        pending[writers.submit(write_outputs, record['results'], self.sinks)] = ('write', record, output_bytes)
+
+                    else:
+                        self.inflight_bytes -= cost
+                        try:
+                            future.result()
+                        except Exception as e:
+                            yield self.on_error(item, e)
+                            continue
+                        item['queue_depths'] = depths
+                        yield item
@@ -0,0 +1,545 @@
+import contextlib
+import cProfile
+import itertools
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from batch_pipeline import StagedPipeline
+from batch_manifest import BatchManifest, MANIFEST_FILENAME, fingerprint_settings, hash_file
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, get_output_format
+from output_sinks import ARCHIVE_SINKS
+from watermark_processor import WatermarkProcessor
+
+OUTPUT_FOLDERS = {
+    'normal': 'output_normal',
+    'watermarked': 'output_wm'
+}
+LOG_FILENAME = 'watermarking_log.csv'
+
+# Per-process processor, created once by the pool initializer
+_worker_processor = None
+
+
+def build_processor(settings):
+    """Create a processor with logo, fonts and attribution data loaded"""
+    processor = WatermarkProcessor(font_path=settings.get('font_path'),
+                                   encoder_profile=settings.get('encoder_profile', DEFAULT_ENCODER_PROFILE),
+                                   frame_threads=settings.get('frame_threads'),
+                                   overlay_cache_mb=settings.get('overlay_cache_mb', 64))
+
+    if settings.get('logo_path'):
+        processor.load_logo(settings['logo_path'])
+
+    if settings.get('csv_path'):
+        processor.load_attribution_csv(settings['csv_path'], settings.get('csv_index'))
+
+    # Resolve the font once up front instead of on the first image
+    processor.get_font()
+    return processor
+
+
+def _init_worker(settings):
+    """Pool initializer: load shared assets once per worker process"""
+    global _worker_processor
+    # Ctrl+C is handled by the parent, which lets the images in progress finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_processor = build_processor(settings)
+
+
+def _source_info(path):
+    """Size, mtime and content hash of a source, taken before it is rendered"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': hash_file(path)}
+
+
+def _render_task(processor, task):
+    """Render every variant of one image and return a structured result record.
+
+    Tasks flagged 'instrument' collect per-stage timing events into record['stages'];
+    a task with a 'profile_path' is run under cProfile and its stats dumped there.
+    Tasks from the staged pipeline carry the file contents in 'source' and get their
+    encoded outputs back as result['data'] for the write stage.
+    """
+    start_time = time.perf_counter()
+    source_info = None
+    if task['track_source']:
+        source_info = task.get('source_info') or _source_info(task['path'])
+
+    stages = [] if task.get('instrument') else None
+    profiler = cProfile.Profile() if task.get('profile_path') else None
+    processor.stage_hook = stages.append if stages is not None else None
+    try:
+        if profiler:
+            profiler.enable()
+        results = processor.render_variants(task['path'], task['variants'], task['watermark_text'],
+                                            task['photographer'], task['subfolder'],
+                                            source=task.get('source'),
+                                            encode_only=task.get('source') is not None,
+                                            relative_path=task['key'])
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(task['profile_path'])
+        processor.stage_hook = None
+
+    return {
+        'elapsed': time.perf_counter() - start_time,
+        'index': task['index'],
+        'path': task['path'],
+        'key': task['key'],
+        'fingerprint': task.get('fingerprint'),
+        'photographer': task['photographer'],
+        'source': source_info,
+        'stages': stages,
+        'worker': os.getpid(),
+        'overlay_cache': processor.get_overlay_cache_stats(),
+        'results': results
+    }
+
+
+def _process_task(task):
+    """Entry point executed inside a worker process"""
+    # Workers kept alive across runs pick up an edited attribution CSV too
+    _worker_processor.attributions.refresh()
+    return _render_task(_worker_processor, task)
+
+
+class BatchProcessor:
+    """Spread a batch of images over a pool of worker processes.
+
+    Workers never touch the attribution logs: they hand their log rows back and
+    the parent process appends them, so each log has a single writer.
+
+    With archive set to 'zip' or 'tar', each mode's outputs are streamed into
+    one archive in the parent output folder (e.g. output_normal.zip) instead
+    of being written as separate files; see get_archive_paths().
+
+    Each run() starts its own worker pool unless start_workers() was called,
+    which keeps one pool (and the assets loaded in it) for every run until
+    close_workers().
+    """
+
+    def __init__(self, watermark_text, logo_path=None, csv_path=None, jobs=None,
+                 modes=('normal', 'watermarked'), font_path=None,
+                 encoder_profile=DEFAULT_ENCODER_PROFILE, pipeline=True, io_threads=4,
+                 max_inflight_mb=256, csv_index=None, overlay_cache_mb=64, archive=None):
+        if archive is not None and archive not in ARCHIVE_SINKS:
+            raise ValueError(f"Unknown archive format '{archive}', "
+                             f"expected one of: {', '.join(ARCHIVE_SINKS)}")
+        if archive and not pipeline:
+            raise ValueError("Archive output needs the staged pipeline")
+
+        self.watermark_text = watermark_text
+        self.modes = tuple(modes)
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        # Staged read/render/write pipeline; False renders each image start to finish
+        self.pipeline = pipeline
+        self.io_threads = max(1, io_threads)
+        self.max_inflight_mb = max_inflight_mb
+        self.archive = archive
+        self._pipeline_stats = None
+        self._overlay_cache_stats = {}
+        self._pool = None
+        self._pool_broken = False
+        self.settings = {
+            'logo_path': logo_path,
+            'csv_path': csv_path,
+            'font_path': font_path,
+            'encoder_profile': encoder_profile,
+            'csv_index': csv_index,
+            'overlay_cache_mb': overlay_cache_mb,
+            # Animation frames share the cores left over by the worker processes
+            'frame_threads': max(1, (os.cpu_count() or 1) // self.jobs)
+        }
+        # Processor used in-process for a single job and for reporting loaded assets
+        self.processor = build_processor(self.settings)
+        self.logo_hash = hash_file(logo_path) if logo_path and self.processor.logo_image else None
+
+    def start_workers(self):
+        """Keep one worker pool alive across run() calls until close_workers()"""
+        if self.jobs > 1 and self._pool is None:
+            self._pool = self._new_pool()
+            self._pool_broken = False
+
+    def close_workers(self):
+        """Shut down the pool started by start_workers(), if any"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.shutdown()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                   initargs=(self.settings,))
+
+    def _open_pool(self):
+        """Worker pool for one run: the kept pool (replaced if a worker died) or a new one
+        that is shut down when the run ends"""
+        if self._pool is None:
+            return self._new_pool()
+        if self._pool_broken:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+            self._pool_broken = False
+        return contextlib.nullcontext(self._pool)
+
+    def get_output_folders(self, parent_output_folder):
+        """Map each mode to its output folder under the parent output folder"""
+        return {mode: Path(parent_output_folder) / OUTPUT_FOLDERS[mode] for mode in self.modes}
+
+    def get_archive_paths(self, parent_output_folder):
+        """Map each mode to the archive its outputs go to, or None without archive output"""
+        if not self.archive:
+            return None
+        extension = ARCHIVE_SINKS[self.archive].extension
+        return {mode: Path(parent_output_folder) / (OUTPUT_FOLDERS[mode] + extension) for mode in self.modes}
+
+    def _build_task(self, index, img_info, output_folders, track_source=False):
+        """Describe the variants to render for one image"""
+        img_file = Path(img_info['path'])
+        photographer = img_info['photographer']
+
+        variants = []
+        for mode, folder in output_folders.items():
+            if photographer:
+                output_file = folder / photographer / img_file.name
+            else:
+                output_file = folder / img_file.name
+
+            variants.append({'mode': mode, 'output_path': str(output_file), 'log_path': None})
+
+        return {
+            'index': index,
+            'path': str(img_file),
+            'key': Path(img_info['relative_path']).as_posix(),
+            'track_source': track_source,
+            'photographer': photographer,
+            'subfolder': img_info['subfolder'],
+            'watermark_text': self.watermark_text,
+            'variants': variants
+        }
+
+    def _settings_fingerprint(self, task):
+        """Digest of everything besides the source pixels that affects a task's outputs"""
+        attribution = self.processor.get_attribution(task['path'], task['key'])
+        return fingerprint_settings({
+            'watermark_text': task['watermark_text'],
+            'logo': self.logo_hash,
+            'font_path': self.settings['font_path'],
+            'encoder_profile': self.settings['encoder_profile'],
+            'modes': [variant['mode'] for variant in task['variants']],
+            'photographer': task['photographer'],
+            'subfolder': task['subfolder'],
+            'attribution': attribution
+        })
+
+    def run(self, image_files, parent_output_folder, progress_callback=None, incremental=False,
+            stage_recorder=None, profile_image=None, profile_path=None):
+        """Process all images and return a summary of the run.
+
+        image_files may be a list or a lazy iterable such as iter_images(), in
+        which case processing starts while the scan is still running.
+        progress_callback(record, done, total) is called in the calling thread
+        as each image finishes; total is the number of images found so far.
+        With incremental=True a manifest in the parent output folder records
+        what was rendered, and images whose source, settings and outputs are
+        unchanged since a previous run are skipped (reported with
+        record['skipped'] set).
+        summary['encoding'] holds the encoder profile and, per output format,
+        the number of files saved, the seconds spent encoding and bytes written.
+        summary['overlay_cache'] totals the pattern layer cache counters of all
+        workers (hits, misses, hit_rate, evictions and bytes held).
+        With archive output, every image is rendered (incremental is ignored, as
+        each run writes complete archives), the outputs and each mode's
+        attribution log for this run go into the archives, and
+        summary['archives'] gives the path, entry count and bytes of each.
+        With the staged pipeline, summary['queue_depths'] gives the max and mean
+        depth of each stage and each record carries record['queue_depths'].
+        With a stage_recorder (e.g. instrumentation.StageRecorder) every image is
+        timed per stage, the events are passed to stage_recorder.add_events() and
+        the per-stage summary is returned as summary['stages']. profile_image (a
+        relative path or file name) selects one image to run under cProfile, with
+        the stats written to profile_path.
+        """
+        start_time = time.perf_counter()
+        # Pick up an attribution CSV edited since the last run (workers load it afresh)
+        self.processor.attributions.refresh()
+        self._overlay_cache_stats = {}
+        output_folders = self.get_output_folders(parent_output_folder)
+        sinks = self._open_archives(parent_output_folder)
+        if sinks:
+            # Each log is kept next to its archive during the run, then added to it
+            log_paths = {mode: f"{sink.archive_path}.log.part" for mode, sink in sinks.items()}
+            for log_path in log_paths.values():
+                if os.path.exists(log_path):
+                    os.remove(log_path)
+        else:
+            for folder in output_folders.values():
+                folder.mkdir(parents=True, exist_ok=True)
+            log_paths = {mode: str(folder / LOG_FILENAME) for mode, folder in output_folders.items()}
+
+        manifest = (BatchManifest(Path(parent_output_folder) / MANIFEST_FILENAME)
+                    if incremental and not sinks else None)
+        summary = {
+            'total': 0,
+            'skipped': 0,
+            'succeeded': {mode: 0 for mode in self.modes},
+            'failed': [],
+            'decode_scales': {},
+            'encoding': {'profile': self.settings['encoder_profile'], 'formats': {}},
+            'elapsed': 0.0
+        }
+        progress = {'done': 0}
+
+        def report(record):
+            progress['done'] += 1
+            if progress_callback:
+                progress_callback(record, progress['done'], summary['total'])
+
+        # One buffered writer per log for the whole run; closed even on error or cancel
+        for log_path in log_paths.values():
+            self.processor.open_log_writer(log_path)
+
+        completed = False
+        try:
+            tasks = self._iter_tasks(image_files, output_folders, summary, manifest is not None)
+            if stage_recorder is not None or profile_image:
+                tasks = self._instrument_tasks(tasks, stage_recorder is not None,
+                                               profile_image, profile_path)
+            if manifest:
+                tasks = self._skip_unchanged(tasks, manifest, summary, report)
+            self._collect(tasks, log_paths, summary, report, manifest, stage_recorder, sinks)
+            if self._pipeline_stats is not None:
+                summary['queue_depths'] = self._pipeline_stats.depth_stats()
+            summary['overlay_cache'] = self._merge_overlay_cache_stats()
+            completed = True
+        finally:
+            self.processor.close_log_writers()
+            if manifest:
+                manifest.close()
+            if sinks:
+                self._close_archives(sinks, log_paths, completed)
+
+        if sinks:
+            summary['archives'] = {mode: {'path': str(sink.archive_path), 'entries': sink.entries,
+                                          'bytes': sink.bytes_written}
+                                   for mode, sink in sinks.items()}
+
+        if stage_recorder is not None:
+            summary['stages'] = stage_recorder.summary()
+        summary['elapsed'] = time.perf_counter() - start_time
+        return summary
+
+    def _open_archives(self, parent_output_folder):
+        """Start one archive per mode, rooted at the parent output folder"""
+        archive_paths = self.get_archive_paths(parent_output_folder)
+        if not archive_paths:
+            return None
+        sink_class = ARCHIVE_SINKS[self.archive]
+        return {mode: sink_class(path, parent_output_folder) for mode, path in archive_paths.items()}
+
+    def _close_archives(self, sinks, log_paths, completed):
+        """Add each mode's log and finish its archive, or discard the archives of an interrupted run"""
+        for mode, sink in sinks.items():
+            log_path = log_paths[mode]
+            if completed:
+                sink.add_file(log_path, f"{OUTPUT_FOLDERS[mode]}/{LOG_FILENAME}")
+                sink.close()
+            else:
+                sink.abort()
+            if os.path.exists(log_path):
+                os.remove(log_path)
+
+    def _iter_tasks(self, image_files, output_folders, summary, track_source):
+        """Turn image records into tasks lazily, counting them as they are found"""
+        for index, img_info in enumerate(image_files):
+            summary['total'] += 1
+            yield self._build_task(index, img_info, output_folders, track_source)
+
+    def _instrument_tasks(self, tasks, instrument, profile_image, profile_path):
+        """Flag tasks for stage timing and mark the first one matching profile_image for cProfile"""
+        profiled = False
+        for task in tasks:
+            task['instrument'] = instrument
+            if (profile_image and not profiled and
+                    profile_image in (task['key'], Path(task['path']).name)):
+                task['profile_path'] = str(profile_path or Path(task['path']).stem + '.prof')
+                profiled = True
+            yield task
+
+    def _skip_unchanged(self, tasks, manifest, summary, report):
+        """Report tasks the manifest says are up to date and yield the rest"""
+        for task in tasks:
+            task['fingerprint'] = self._settings_fingerprint(task)
+            output_paths = [variant['output_path'] for variant in task['variants']]
+
+            if manifest.is_current(task['key'], task['path'], task['fingerprint'], output_paths):
+                summary['skipped'] += 1
+                report({
+                    'index': task['index'],
+                    'path': task['path'],
+                    'key': task['key'],
+                    'photographer': task['photographer'],
+                    'skipped': True,
+                    'results': []
+                })
+            else:
+                yield task
+
+    def _collect(self, tasks, log_paths, summary, report, manifest=None, stage_recorder=None, sinks=None):
+        """Gather result records into the summary, the attribution logs and the manifest"""
+        for record in self._iter_records(tasks, sinks):
+            if stage_recorder is not None and record.get('stages'):
+                stage_recorder.add_events(record['stages'])
+            # Cache counters are cumulative per worker, so the latest record of each wins
+            if record.get('overlay_cache'):
+                self._overlay_cache_stats[record['worker']] = record['overlay_cache']
+
+            # Count the decode-time downscales so their effect on a corpus can be checked
+            decode_info = record['results'][0].get('decode') if record['results'] else None
+            if decode_info:
+                scale_key = f"{decode_info['method']} 1/{decode_info['scale']}"
+                summary['decode_scales'][scale_key] = summary['decode_scales'].get(scale_key, 0) + 1
+
+            log_rows = {mode: [] for mode in self.modes}
+            for result in record['results']:
+                if result['success']:
+                    summary['succeeded'][result['mode']] += 1
+                    log_rows[result['mode']].append(result['log_row'])
+                    self._tally_encoding(summary['encoding'], result)
+                else:
+                    summary['failed'].append({
+                        'path': record['path'],
+                        'key': record['key'],
+                        'mode': result['mode'],
+                        'error': result.get('error', '')
+                    })
+
+            for mode, rows in log_rows.items():
+                if rows:
+                    self.processor.append_log_rows(log_paths[mode], rows)
+
+            if manifest:
+                if record['source'] and all(result['success'] for result in record['results']):
+                    manifest.record(record['key'], record['source'], record['fingerprint'],
+                                    [result['output_path'] for result in record['results']])
+                else:
+                    manifest.forget(record['key'])
+
+            report(record)
+
+    def _merge_overlay_cache_stats(self):
+        """Sum the latest pattern layer cache counters reported by each worker"""
+        merged = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+        for stats in self._overlay_cache_stats.values():
+            for key in merged:
+                merged[key] += stats[key]
+        lookups = merged['hits'] + merged['misses']
+        merged['hit_rate'] = merged['hits'] / lookups if lookups else 0.0
+        return merged
+
+    def _tally_encoding(self, encoding, result):
+        """Add one saved output's encode time and size to the per-format totals"""
+        image_format = get_output_format(result['output_path']) or 'other'
+        totals = encoding['formats'].setdefault(image_format, {'count': 0, 'time': 0.0, 'bytes': 0})
+        totals['count'] += 1
+        totals['time'] += result.get('encode_time', 0.0)
+        totals['bytes'] += result.get('output_size', 0)
+
+    def _iter_records(self, tasks, sinks=None):
+        """Yield result records as images finish, in completion order"""
+        self._pipeline_stats = None
+        if self.pipeline:
+            yield from self._iter_pipeline_records(tasks, sinks)
+            return
+
+        task_iter = iter(tasks)
+        first_task = next(task_iter, None)
+        if first_task is None:
+            return
+
+        if self.jobs == 1:
+            yield self._safe_render(first_task)
+            for task in task_iter:
+                yield self._safe_render(task)
+            return
+
+        # Keep a bounded number of tasks in flight so results stream back steadily;
+        # the task iterator (and any scan behind it) only advances as slots free up
+        max_pending = self.jobs * 2
+        pending = {}
+
+        with self._open_pool() as executor:
+            pending[executor.submit(_process_task, first_task)] = first_task
+            for task in task_iter:
+                pending[executor.submit(_process_task, task)] = task
+                if len(pending) >= max_pending:
+                    break
+
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        yield self._failed_record(task, e)
+
+                    next_task = next(task_iter, None)
+                    if next_task is not None:
+                        pending[executor.submit(_process_task, next_task)] = next_task
+
+    def _iter_pipeline_records(self, tasks, sinks=None):
+        """Yield result records from the staged read -> render/encode -> write pipeline"""
+        task_iter = iter(tasks)
+        first_task = next(task_iter, None)
+        if first_task is None:
+            return
+
+        if self.jobs == 1:
+            # A single render thread in this process, overlapped with the I/O threads
+            pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='wm-render')
+        else:
+            pool = self._open_pool()
+
+        with pool as executor:
+            if self.jobs == 1:
+                submit_render = lambda task: executor.submit(_render_task, self.processor, task)
+            else:
+                submit_render = lambda task: executor.submit(_process_task, task)
+
+            pipeline = StagedPipeline(submit_render, self._failed_record,
+                                      max_render_pending=self.jobs * 2,
+                                      read_threads=self.io_threads,
+                                      write_threads=max(1, self.io_threads // 2),
+                                      max_inflight_bytes=int(self.max_inflight_mb * 1024 * 1024),
+                                      sinks=sinks)
+            self._pipeline_stats = pipeline
+            yield from pipeline.run(itertools.chain([first_task], task_iter))
+
+    def _safe_render(self, task):
+        """Render a task in-process, turning unexpected errors into a failed record"""
+        try:
+            return _render_task(self.processor, task)
+        except Exception as e:
+            return self._failed_record(task, e)
+
+    def _failed_record(self, task, error):
+        """Build a record marking every variant of a task as failed"""
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; a kept pool is replaced before the next run
+            self._pool_broken = True
+        return {
+            'elapsed': 0.0,
+            'index': task['index'],
+            'path': task['path'],
+            'key': task['key'],
+            'fingerprint': task.get('fingerprint'),
+            'photographer': task['photographer'],
+            'source': None,
+            'results': [{'mode': variant['mode'], 'output_path': variant['output_path'],
+                         'success': False, 'error': str(error)} for variant in task['variants']]
+        }
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""Reproducible throughput benchmark on a synthetic photo corpus.
+
+Generates a deterministic corpus (mixed formats and sizes in photographer
+subfolders), runs the batch engine for each watermark mode at several job
+counts and encoder profiles and reports images/s, p50/p95 per-image latency,
+encode time, output size and peak RSS. Results are written as JSON; pass
+--compare to flag slowdowns against an earlier run. A configuration that
+fails, or whose process dies (e.g. killed when out of memory), is recorded
+with its error and exit code and the remaining ones still run.
+
+    python benchmark.py --corpus-size small --jobs 1 4 --output bench.json
+    python benchmark.py --profiles fast balanced archive --jobs 4
+    python benchmark.py --compare bench.json --threshold 0.10
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Seconds between RSS samples of a configuration and its worker pool
+SAMPLE_INTERVAL = 0.02
+# Seconds between checks that a configuration's process is still alive
+RESULT_POLL_SECONDS = 1.0
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+CORPUS_VERSION = 1
+CORPUS_STAMP = '.corpus.json'
+
+# (width, height) from phone shots up to 50 MP
+SIZES = [
+    (1080, 1920),
+    (3024, 4032),
+    (4000, 3000),
+    (6000, 4000),
+    (8660, 5773)
+]
+FORMATS = ['.jpg', '.jpg', '.jpg', '.png', '.webp', '.tiff', '.gif']
+
+# Images per photographer folder and number of folders for each corpus size
+CORPUS_SIZES = {
+    'tiny': (2, 3),
+    'small': (4, 6),
+    'full': (10, 12)
+}
+
+
+def corpus_spec(corpus_size, seed):
+    """Describe every file of the corpus; the same arguments always give the same list"""
+    per_folder, folders = CORPUS_SIZES[corpus_size]
+    rng = random.Random(seed)
+    spec = []
+    for folder_index in range(folders):
+        folder = f"photographer_{folder_index:02d}"
+        for image_index in range(per_folder):
+            size = rng.choice(SIZES) if corpus_size == 'full' else rng.choice(SIZES[:4])
+            if rng.random() < 0.5:
+                size = (size[1], size[0])
+            ext = rng.choice(FORMATS)
+            spec.append({
+                'path': f"{folder}/IMG_{image_index:04d}{ext}",
+                'size': list(size),
+                'seed': rng.randrange(2 ** 32)
+            })
+    return spec
+
+
+def synthesize_image(width, height, seed):
+    """Photo-like test image: smooth colour field from upscaled noise plus shapes"""
+    rng = random.Random(seed)
+    base = Image.frombytes('RGB', (32, 24), rng.randbytes(32 * 24 * 3))
+    img = base.resize((width, height), Image.Resampling.BICUBIC)
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(24):
+        x = rng.randrange(width)
+        y = rng.randrange(height)
+        radius = rng.randrange(max(2, width // 40), max(3, width // 6))
+        colour = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=colour)
+    return img
+
+
+def ensure_corpus(corpus_dir, corpus_size, seed):
+    """Generate the corpus unless an identical one already exists in corpus_dir"""
+    corpus_dir = Path(corpus_dir)
+    spec = corpus_spec(corpus_size, seed)
+    stamp = {'version': CORPUS_VERSION, 'corpus_size': corpus_size, 'seed': seed}
+
+    stamp_path = corpus_dir / CORPUS_STAMP
+    if stamp_path.exists():
+        try:
+            if json.loads(stamp_path.read_text()) == stamp:
+                return spec
+        except ValueError:
+            pass
+
+    shutil.rmtree(corpus_dir, ignore_errors=True)
+    for item in spec:
+        path = corpus_dir / item['path']
+        path.parent.mkdir(parents=True, exist_ok=True)
+        img = synthesize_image(item['size'][0], item['size'][1], item['seed'])
+        if path.suffix == '.gif':
+            img = img.convert('P', palette=Image.Palette.ADAPTIVE)
+        img.save(path, quality=92)
+        print(f"  generated {item['path']} ({item['size'][0]}x{item['size'][1]})")
+
+    stamp_path.write_text(json.dumps(stamp))
+    return spec
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, in MB.
+
+    Fallback for platforms without /proc. On Linux ru_maxrss survives fork
+    and exec, so a spawned process reports its parent's peak when that is
+    higher; RSSSampler measures the configuration itself instead.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return peak / divisor
+
+
+def process_rss(pid):
+    """Current resident set size of a process in bytes, 0 if it has exited"""
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def child_pids(pid):
+    """Pids of the live children of a process (e.g. its worker pool)"""
+    children = []
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry.name}/stat', 'r') as file:
+                stat = file.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; the parent pid follows it
+        if int(stat[stat.rindex(')') + 2:].split()[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+
+class RSSSampler:
+    """Peak combined RSS of this process and its worker pool, sampled from /proc.
+
+    The baseline is this process as it starts the configuration, not the
+    driver that spawned it, so every configuration reports its own footprint
+    whatever the driver touched before (e.g. generating the corpus).
+    Workers are summed because they hold their images at the same time.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = 0
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def available():
+        return os.path.exists(f'/proc/{os.getpid()}/statm')
+
+    def start(self):
+        self.sample()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the peak in MB"""
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return self.peak / (1024 * 1024)
+
+    def sample(self):
+        total = process_rss(self._pid) + sum(process_rss(pid) for pid in child_pids(self._pid))
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def run_configuration(corpus_dir, mode, jobs, profile, watermark_text, logo_path, queue):
+    """Run one benchmark configuration; executed in a fresh process for clean RSS numbers"""
+    from batch_processor import BatchProcessor
+
+    output_dir = tempfile.mkdtemp(prefix='wm_bench_')
+    sampler = RSSSampler().start() if RSSSampler.available() else None
+    try:
+        batch = BatchProcessor(watermark_text, logo_path, jobs=jobs, modes=(mode,),
+                               encoder_profile=profile)
+        latencies = []
+        bytes_read = 0
+
+        def on_progress(record, done, total):
+            nonlocal bytes_read
+            latencies.append(record['elapsed'])
+            bytes_read += os.path.getsize(record['path'])
+
+        summary = batch.run(batch.processor.iter_images(corpus_dir), output_dir,
+                            progress_callback=on_progress)
+        elapsed = max(summary['elapsed'], 1e-9)
+        peak_rss = sampler.stop() if sampler else peak_rss_mb()
+        encoded = summary['encoding']['formats'].values()
+        queue.put({
+            'mode': mode,
+            'jobs': jobs,
+            'profile': profile,
+            'images': summary['total'],
+            'failures': len(summary['failed']),
+            'elapsed_s': elapsed,
+            'images_per_s': summary['total'] / elapsed,
+            'mb_per_s': bytes_read / elapsed / (1024 * 1024),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'encode_s': sum(totals['time'] for totals in encoded),
+            'output_mb': sum(totals['bytes'] for totals in encoded) / (1024 * 1024),
+            'peak_rss_mb': peak_rss
+        })
+    except Exception as e:
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def wait_for_result(process, result_queue):
+    """The result a configuration's process reports, or None if it dies without one"""
+    while True:
+        try:
+            return result_queue.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+    # A result sent just before exiting may still be in the pipe
+    try:
+        return result_queue.get(timeout=RESULT_POLL_SECONDS)
+    except queue.Empty:
+        return None
+
+
+def failed_runs(results):
+    """Runs of results that did not complete"""
+    return [run for run in results['runs'] if 'error' in run]
+
+
+def run_benchmark(args):
+    print(f"Preparing '{args.corpus_size}' corpus in {args.corpus_dir} ...")
+    spec = ensure_corpus(args.corpus_dir, args.corpus_size, args.seed)
+
+    logo_path = args.logo
+    if logo_path is None:
+        default_logo = Path(__file__).parent / 'assets' / 'logo.png'
+        logo_path = str(default_logo) if default_logo.exists() else None
+
+    # Spawned (not forked) so each configuration starts with a clean RSS baseline
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    configurations = [(mode, jobs, profile) for mode in args.modes
+                      for jobs in args.jobs for profile in args.profiles]
+    for mode, jobs, profile in configurations:
+        for repeat in range(args.repeat):
+            result_queue = context.Queue()
+            process = context.Process(
+                target=run_configuration,
+                args=(args.corpus_dir, mode, jobs, profile, args.text, logo_path, result_queue))
+            process.start()
+            result = wait_for_result(process, result_queue)
+            process.join()
+            if result is None:
+                result = {'error': f"process exited with code {process.exitcode} before reporting"}
+            result['repeat'] = repeat
+            runs.append(result)
+            if 'error' in result:
+                result.update({'mode': mode, 'jobs': jobs, 'profile': profile, 'exitcode': process.exitcode})
+                print(f"  {mode:<12} jobs={jobs:<3} {profile:<9} FAILED: {result['error']}")
+                continue
+            print(f"  {mode:<12} jobs={jobs:<3} {profile:<9} {result['images_per_s']:7.2f} img/s  "
+                  f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                  f"encode {result['encode_s']:6.2f} s  out {result['output_mb']:7.1f} MB  "
+                  f"peak RSS {result['peak_rss_mb'] or 0:7.1f} MB")
+
+    import PIL
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'corpus_size': args.corpus_size,
+            'corpus_images': len(spec),
+            'seed': args.seed
+        },
+        'runs': runs
+    }
+
+
+def best_runs(results):
+    """Best images/s (and its latency) per (mode, jobs, profile) over completed repeats"""
+    best = {}
+    for run in results['runs']:
+        if 'error' in run:
+            continue
+        key = (run['mode'], run['jobs'], run.get('profile', DEFAULT_ENCODER_PROFILE))
+        if key not in best or run['images_per_s'] > best[key]['images_per_s']:
+            best[key] = run
+    return best
+
+
+def compare(baseline, current, threshold):
+    """Return human-readable regressions of current against baseline"""
+    regressions = []
+    baseline_runs = best_runs(baseline)
+    current_runs = best_runs(current)
+    for run in failed_runs(current):
+        key = (run['mode'], run['jobs'], run['profile'])
+        if key in baseline_runs and key not in current_runs:
+            regressions.append(f"{key[0]} jobs={key[1]} profile={key[2]}: failed ({run['error']})")
+            # Reported once, however many repeats failed
+            baseline_runs.pop(key)
+
+    for key, run in sorted(current_runs.items()):
+        old = baseline_runs.get(key)
+        if not old:
+            continue
+
+        label = f"{key[0]} jobs={key[1]} profile={key[2]}"
+        if run['images_per_s'] < old['images_per_s'] * (1 - threshold):
+            regressions.append(f"{label}: throughput {old['images_per_s']:.2f} -> "
+                               f"{run['images_per_s']:.2f} img/s")
+        if run['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append(f"{label}: p95 latency {old['p95_ms']:.1f} -> {run['p95_ms']:.1f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'triyog_bench_corpus'),
+                        help="where the synthetic corpus is generated and cached")
+    parser.add_argument('--corpus-size', choices=sorted(CORPUS_SIZES), default='small')
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--modes', nargs='+', choices=('normal', 'watermarked'),
+                        default=['normal', 'watermarked'])
+    parser.add_argument('--jobs', nargs='+', type=int, default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--profiles', nargs='+', choices=sorted(ENCODER_PROFILES),
+                        default=[DEFAULT_ENCODER_PROFILE], help="encoder profiles to compare")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per configuration (best is compared)")
+    parser.add_argument('--text', default='PNJWEW2025')
+    parser.add_argument('--logo', help="logo to use (default: assets/logo.png)")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="allowed relative slowdown before flagging (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    failed = failed_runs(results)
+    if failed:
+        print(f"{len(failed)} run(s) failed")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Command-line batch watermarking; never imports tkinter."""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES
+from output_sinks import ARCHIVE_SINKS
+from watch_folder import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS
+
+SPLASH = r"""
+  _____     _
+ |_   _| __(_)_   _  ___   __ _
+   | || '__| | | | |/ _ \ / _` |
+   | || |  | | |_| | (_) | (_| |
+   |_||_|  |_|\__, |\___/ \__, |
+              |___/       |___/  Watermarker
+"""
+
+MODE_CHOICES = ('normal', 'watermarked')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='triyog-watermark',
+        description="Batch watermark a folder of photographer subfolders into "
+                    "'output_normal' and 'output_wm'.")
+    parser.add_argument('-i', '--input', required=True,
+                        help="input folder (images and/or photographer subfolders)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="parent output folder")
+    parser.add_argument('-t', '--text', default='PNJWEW2025',
+                        help="watermark text (default: %(default)s)")
+    parser.add_argument('--logo', help="logo image (PNG recommended)")
+    parser.add_argument('--csv', help="attribution CSV (filename, team_name, caption, photographer); "
+                                      "filename may be a file name or a path under the input folder")
+    parser.add_argument('--csv-index', action=argparse.BooleanOptionalAction, default=None,
+                        help="keep the CSV in an on-disk SQLite index (default: only for large CSVs)")
+    parser.add_argument('--font', help="font file to use instead of probing system fonts")
+    parser.add_argument('--modes', nargs='+', choices=MODE_CHOICES, default=list(MODE_CHOICES),
+                        help="outputs to render (default: both)")
+    parser.add_argument('--profile', choices=sorted(ENCODER_PROFILES), default=DEFAULT_ENCODER_PROFILE,
+                        help="per-format save settings to use (default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int,
+                        help="worker processes (default: one per CPU, or 1 with --watch "
+                             "so the renderer stays loaded between arrivals)")
+    parser.add_argument('--pipeline', action=argparse.BooleanOptionalAction, default=True,
+                        help="overlap reading, rendering and writing in bounded stages (default: on)")
+    parser.add_argument('--max-inflight-mb', type=float, default=256,
+                        help="cap on source and encoded bytes held by the pipeline (default: %(default)s)")
+    parser.add_argument('--io-threads', type=int, default=4,
+                        help="read-ahead threads; write-behind gets half as many (default: %(default)s)")
+    parser.add_argument('--overlay-cache-mb', type=float, default=64,
+                        help="memory per worker for cached watermark pattern layers (default: %(default)s)")
+    parser.add_argument('--archive', choices=sorted(ARCHIVE_SINKS),
+                        help="stream each mode's outputs and attribution log into one archive "
+                             "(output_normal.zip, output_wm.zip) instead of separate files; "
+                             "every image is rendered")
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=True,
+                        help="skip images unchanged since the last run (default: on)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and process images as they arrive in the input folder")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks for new images with --watch (default: %(default)s)")
+    parser.add_argument('--settle-seconds', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="how long a new file must stay unchanged before it is processed "
+                             "(default: %(default)s)")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="only print the final summary and failures")
+    parser.add_argument('--stage-timings', action='store_true',
+                        help="time each processing stage and print a per-stage table")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="write per-stage events as a Chrome trace (implies --stage-timings)")
+    parser.add_argument('--cprofile', metavar='IMAGE',
+                        help="run the image with this relative path or file name under cProfile")
+    parser.add_argument('--cprofile-out', metavar='FILE',
+                        help="where to write the cProfile stats (default: <image name>.prof)")
+    return parser
+
+
+def validate_args(parser, args):
+    if not os.path.isdir(args.input):
+        parser.error(f"input folder does not exist: {args.input}")
+    if args.logo and not os.path.isfile(args.logo):
+        parser.error(f"logo file does not exist: {args.logo}")
+    if args.csv and not os.path.isfile(args.csv):
+        parser.error(f"attribution CSV does not exist: {args.csv}")
+    if not args.text.strip():
+        parser.error("watermark text must not be empty")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.max_inflight_mb <= 0:
+        parser.error("--max-inflight-mb must be positive")
+    if args.overlay_cache_mb < 0:
+        parser.error("--overlay-cache-mb must not be negative")
+    if args.io_threads < 1:
+        parser.error("--io-threads must be at least 1")
+    if args.poll_interval <= 0:
+        parser.error("--poll-interval must be positive")
+    if args.settle_seconds < 0:
+        parser.error("--settle-seconds must not be negative")
+    if args.watch and (args.stage_timings or args.trace or args.cprofile):
+        parser.error("--watch cannot be combined with --stage-timings, --trace or --cprofile")
+    if args.archive and args.watch:
+        parser.error("--archive cannot be combined with --watch")
+    if args.archive and not args.pipeline:
+        parser.error("--archive requires the staged pipeline (drop --no-pipeline)")
+    if args.cprofile_out and not args.cprofile:
+        parser.error("--cprofile-out requires --cprofile")
+
+
+def format_summary(summary, bytes_read):
+    """Render the end-of-run throughput summary"""
+    elapsed = max(summary['elapsed'], 1e-9)
+    processed = summary['total'] - summary['skipped']
+    lines = [
+        f"Images found:    {summary['total']}",
+        f"Skipped:         {summary['skipped']} (unchanged)",
+    ]
+    for mode, count in summary['succeeded'].items():
+        lines.append(f"{mode.capitalize() + ':':<17}{count}/{processed}")
+    lines += [
+        f"Failures:        {len(summary['failed'])}",
+        f"Elapsed:         {elapsed:.2f}s",
+        f"Throughput:      {processed / elapsed:.2f} images/s, "
+        f"{bytes_read / elapsed / (1024 * 1024):.2f} MB/s read"
+    ]
+    if summary['decode_scales']:
+        scales = ', '.join(f"{name}: {count}" for name, count in sorted(summary['decode_scales'].items()))
+        lines.append(f"Decode scales:   {scales}")
+    if summary.get('queue_depths'):
+        depths = ', '.join(f"{stage} {stats['mean']:.1f}/{stats['max']:.0f}"
+                           for stage, stats in summary['queue_depths'].items())
+        lines.append(f"Queue depths:    {depths} (mean/max)")
+    cache = summary.get('overlay_cache')
+    if cache and cache['hits'] + cache['misses']:
+        lines.append(f"Pattern cache:   {cache['hit_rate']:.0%} hits ({cache['hits']}/{cache['hits'] + cache['misses']}), "
+                     f"{cache['evictions']} evictions, {cache['bytes'] / (1024 * 1024):.1f} MB held")
+    for image_format, totals in sorted(summary['encoding']['formats'].items()):
+        lines.append(f"Encode {image_format + ':':<10}{totals['count']} files, {totals['time']:.2f}s, "
+                     f"{totals['bytes'] / (1024 * 1024):.2f} MB ({summary['encoding']['profile']} profile)")
+    for archive in summary.get('archives', {}).values():
+        lines.append(f"Archive:         {archive['path']} ({archive['entries']} entries, "
+                     f"{archive['bytes'] / (1024 * 1024):.2f} MB)")
+    return '\n'.join(lines)
+
+
+def run_watch(args, batch, on_progress):
+    """Process images as they arrive until Ctrl+C or SIGTERM, then finish the ones in progress"""
+    from watch_folder import FolderWatcher
+
+    failures = 0
+
+    def on_batch(summary):
+        nonlocal failures
+        failures += len(summary['failed'])
+        for failure in summary['failed']:
+            print(f"Failed {failure['mode']}: {failure['path']}: {failure['error']}", file=sys.stderr)
+        processed = summary['total'] - summary['skipped']
+        if processed and not args.quiet:
+            print(f"Batch done: {processed} image(s) in {summary['elapsed']:.2f}s, "
+                  f"{len(summary['failed'])} failure(s)")
+
+    watcher = FolderWatcher(batch, args.input, args.output, poll_interval=args.poll_interval,
+                            settle_seconds=args.settle_seconds, incremental=args.incremental,
+                            progress_callback=on_progress, batch_callback=on_batch)
+
+    def request_stop(signum, frame):
+        print("Stopping after the images in progress...", file=sys.stderr)
+        watcher.stop()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    print(f"Watching {args.input} for new images (Ctrl+C to stop)")
+    watcher.run()
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    validate_args(parser, args)
+
+    # Imported after argument parsing so --help and usage errors stay instant
+    from batch_processor import BatchProcessor
+    from instrumentation import StageRecorder
+
+    if not args.quiet:
+        print(SPLASH)
+
+    start_time = time.perf_counter()
+    jobs = args.jobs or (1 if args.watch else None)
+    batch = BatchProcessor(args.text.strip(), args.logo, args.csv, jobs=jobs,
+                           modes=args.modes, font_path=args.font, encoder_profile=args.profile,
+                           pipeline=args.pipeline, io_threads=args.io_threads,
+                           max_inflight_mb=args.max_inflight_mb, csv_index=args.csv_index,
+                           overlay_cache_mb=args.overlay_cache_mb, archive=args.archive)
+    if args.logo and not batch.processor.logo_image:
+        print(f"Warning: failed to load logo {args.logo}, continuing without logo", file=sys.stderr)
+    if not args.quiet:
+        print(f"Loaded {batch.processor.get_attribution_count()} attribution entries, "
+              f"using {batch.jobs} worker process(es)")
+
+    bytes_read = 0
+
+    def on_progress(record, done, total):
+        nonlocal bytes_read
+        if record.get('skipped'):
+            return
+
+        try:
+            bytes_read += os.path.getsize(record['path'])
+        except OSError:
+            pass
+
+        if not args.quiet:
+            failed = [result['mode'] for result in record['results'] if not result['success']]
+            status = f"FAILED ({', '.join(failed)})" if failed else "ok"
+            print(f"[{done}/{total}] {record['key']}: {status}")
+
+    if args.watch:
+        return run_watch(args, batch, on_progress)
+
+    recorder = None
+    if args.stage_timings or args.trace:
+        recorder = StageRecorder(keep_events=bool(args.trace))
+
+    images = batch.processor.iter_images(args.input)
+    summary = batch.run(images, args.output, progress_callback=on_progress,
+                        incremental=args.incremental, stage_recorder=recorder,
+                        profile_image=args.cprofile, profile_path=args.cprofile_out)
+    summary['elapsed'] = time.perf_counter() - start_time
+
+    for failure in summary['failed']:
+        print(f"Failed {failure['mode']}: {failure['path']}: {failure['error']}", file=sys.stderr)
+
+    print(format_summary(summary, bytes_read))
+    if recorder:
+        print()
+        print(recorder.format_table())
+    if args.trace:
+        recorder.write_trace(args.trace)
+        print(f"Stage trace written to {args.trace}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import os
+
+DEFAULT_ENCODER_PROFILE = 'balanced'
+
+# Save options per output format for each profile. 'balanced' matches the
+# original quality=95, optimize=True settings; 'fast' trades size for encode
+# time and 'archive' trades encode time for fidelity.
+ENCODER_PROFILES = {
+    'fast': {
+        'JPEG': {'quality': 90, 'optimize': False, 'subsampling': '4:2:0'},
+        'PNG': {'compress_level': 1},
+        'WEBP': {'quality': 90, 'method': 0},
+        'TIFF': {'compression': 'raw'},
+        'GIF': {'optimize': False},
+        'BMP': {}
+    },
+    'balanced': {
+        'JPEG': {'quality': 95, 'optimize': True},
+        'PNG': {'optimize': True},
+        'WEBP': {'quality': 95},
+        'TIFF': {},
+        'GIF': {'optimize': True},
+        'BMP': {}
+    },
+    'archive': {
+        'JPEG': {'quality': 98, 'optimize': True, 'progressive': True, 'subsampling': '4:4:4'},
+        'PNG': {'optimize': True},
+        'WEBP': {'lossless': True, 'quality': 100, 'method': 6},
+        'TIFF': {'compression': 'tiff_adobe_deflate'},
+        'GIF': {'optimize': True},
+        'BMP': {}
+    }
+}
+
+_FORMATS_BY_EXTENSION = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.webp': 'WEBP',
+    '.tif': 'TIFF',
+    '.tiff': 'TIFF',
+    '.gif': 'GIF',
+    '.bmp': 'BMP'
+}
+
+
+def get_output_format(output_path):
+    """Return the image format an output path is saved as, or None if unknown"""
+    return _FORMATS_BY_EXTENSION.get(os.path.splitext(str(output_path))[1].lower())
+
+
+def get_save_options(profile, output_path):
+    """Return the Image.save() keyword arguments for an output file under a profile"""
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Unknown encoder profile '{profile}', "
+                         f"expected one of: {', '.join(ENCODER_PROFILES)}")
+
+    return dict(ENCODER_PROFILES[profile].get(get_output_format(output_path), {}))
@@ -1,19 +1,38 @@
 import os
 import sys
+import queue
 import threading
+import time
 import subprocess
 from datetime import datetime
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
+from PIL import ImageTk
+
 from watermark_processor import WatermarkProcessor
+from batch_processor import BatchProcessor
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES
+
+# How often the Tk main loop applies updates posted by the worker thread
+UI_POLL_MS = 100
+# Lines kept in the status widget; the full log of a run goes to STATUS_LOG_FILENAME
+STATUS_MAX_LINES = 500
+STATUS_LOG_FILENAME = 'watermarking_status.log'
+# The preview is redrawn this long after the last setting change
+PREVIEW_DEBOUNCE_MS = 100
+# How often the Tk main loop picks up preview images while a preview is rendering
+PREVIEW_POLL_MS = 15
+# Each preview image is scaled to fit within this size
+PREVIEW_SIZE = (380, 250)
+PREVIEW_MODES = (('normal', "Normal"), ('watermarked', "Watermarked"))
 
 class WatermarkGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Triyog Watermarker")
-        self.root.geometry("700x600")
+        self.root.geometry("1150x680")
         self.root.resizable(True, True)
         
         try:
@@ -23,7 +42,28 @@ class WatermarkGUI:
         
         self.processor = WatermarkProcessor()
         self.actual_output_folder = None
+        
+        # Worker threads never touch widgets: they post events here and
+        # poll_ui_queue() applies them from the Tk main loop
+        self.ui_queue = queue.Queue()
+        self.status_log_file = None
+        
+        # Previews render on one background thread with their own processor, so
+        # they never wait for (or disturb) a batch run. Every setting change bumps
+        # the generation; a render for an older generation stops early and its
+        # images are dropped.
+        self.preview_processor = WatermarkProcessor()
+        self.preview_queue = queue.Queue()
+        self.preview_generation = 0
+        self.preview_after_id = None
+        self.preview_running = False
+        self.preview_pending = False
+        self.preview_assets = {'logo_file': None, 'csv_file': None}
+        self.preview_sample = (None, None)
+        self.preview_photos = {}
+        
         self.setup_ui()
+        self.root.after(UI_POLL_MS, self.poll_ui_queue)
         
     def setup_ui(self):
         main_frame = ttk.Frame(self.root, padding="20")
@@ -85,6 +125,20 @@ class WatermarkGUI:
         ttk.Checkbutton(options_frame, text="Preserve folder structure in output", 
                        variable=self.preserve_structure_var).grid(row=0, column=0, sticky=tk.W)
         
+        self.incremental_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Skip images unchanged since the last run", 
+                       variable=self.incremental_var).grid(row=0, column=1, sticky=tk.W, padx=(20, 0))
+        
+        ttk.Label(options_frame, text="Parallel workers:").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        self.jobs_var = tk.IntVar(value=os.cpu_count() or 1)
+        ttk.Spinbox(options_frame, from_=1, to=max(1, os.cpu_count() or 1), width=5,
+                   textvariable=self.jobs_var).grid(row=1, column=1, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+        
+        ttk.Label(options_frame, text="Encoder profile:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        self.encoder_profile_var = tk.StringVar(value=DEFAULT_ENCODER_PROFILE)
+        ttk.Combobox(options_frame, values=list(ENCODER_PROFILES), width=10, state='readonly',
+                    textvariable=self.encoder_profile_var).grid(row=2, column=1, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+        
         progress_frame = ttk.LabelFrame(main_frame, text="Progress", padding="10")
         progress_frame.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 10))
         progress_frame.columnconfigure(0, weight=1)
@@ -125,6 +179,31 @@ class WatermarkGUI:
         
         main_frame.rowconfigure(11, weight=1)
         
+        preview_frame = ttk.LabelFrame(main_frame, text="Preview", padding="10")
+        preview_frame.grid(row=2, column=3, rowspan=10, sticky=(tk.N, tk.S, tk.W, tk.E), padx=(20, 0))
+        preview_frame.columnconfigure(1, weight=1)
+        
+        self.preview_image_var = tk.StringVar()
+        ttk.Button(preview_frame, text="Choose Image", 
+                  command=self.browse_preview_image).grid(row=0, column=0, sticky=tk.W)
+        ttk.Button(preview_frame, text="Use Sample", 
+                  command=lambda: self.preview_image_var.set('')).grid(row=0, column=1, sticky=tk.W, padx=(5, 0))
+        
+        self.preview_status_var = tk.StringVar(value="Select an input folder or an image to preview")
+        ttk.Label(preview_frame, textvariable=self.preview_status_var, font=('Arial', 8), 
+                 foreground='gray', wraplength=PREVIEW_SIZE[0]).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 5))
+        
+        self.preview_labels = {}
+        for row, (mode, title) in enumerate(PREVIEW_MODES, start=2):
+            label = ttk.Label(preview_frame, text=title, compound=tk.TOP, anchor=tk.CENTER)
+            label.grid(row=row, column=0, columnspan=2, pady=(5, 0))
+            self.preview_labels[mode] = label
+        
+        # Any change to what the outputs depend on redraws the preview
+        for var in (self.input_folder_var, self.logo_file_var, self.watermark_var, 
+                    self.csv_file_var, self.preview_image_var):
+            var.trace_add('write', self.schedule_preview)
+        
         self.log_status("Welcome to Triyog Enhanced Dual-Output Watermarking Tool!")
         self.log_status("✨ Features: Two output modes - Normal and Watermarked")
         self.log_status("📁 Normal: Simple attributions and small watermark")
@@ -162,11 +241,233 @@ class WatermarkGUI:
             self.csv_file_var.set(file)
             self.log_status(f"Attribution CSV selected: {file}")
             
+    def browse_preview_image(self):
+        file = filedialog.askopenfilename(
+            title="Select Image to Preview",
+            initialdir=self.input_folder_var.get() or None,
+            filetypes=[("Image files", "*.jpg *.jpeg *.png *.bmp *.tiff *.tif *.webp *.gif"), ("All files", "*.*")]
+        )
+        if file:
+            self.preview_image_var.set(file)
+            
+    def schedule_preview(self, *args):
+        # Restart the debounce timer; a render already under way gives up
+        self.preview_generation += 1
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.start_preview)
+        
+    def start_preview(self):
+        self.preview_after_id = None
+        if self.preview_running:
+            # Started again by finish_preview() once the stale render stops
+            self.preview_pending = True
+            return
+        
+        # Tk variables are read here, on the main thread, not by the preview thread
+        settings = {
+            'image_path': self.preview_image_var.get(),
+            'input_folder': self.input_folder_var.get(),
+            'watermark_text': self.watermark_var.get().strip(),
+            'csv_file': self.csv_file_var.get(),
+            'logo_file': self.logo_file_var.get()
+        }
+        if not (settings['image_path'] or os.path.isdir(settings['input_folder'])):
+            self.preview_status_var.set("Select an input folder or an image to preview")
+            return
+        if not settings['watermark_text']:
+            self.preview_status_var.set("Enter watermark text to preview")
+            return
+        
+        self.preview_running = True
+        self.preview_status_var.set("Rendering preview...")
+        preview_thread = threading.Thread(target=self.render_preview, 
+                                          args=(self.preview_generation, settings))
+        preview_thread.daemon = True
+        preview_thread.start()
+        self.root.after(PREVIEW_POLL_MS, self.poll_preview_queue)
+        
+    def render_preview(self, generation, settings):
+        # Runs on the preview thread; results go through preview_queue
+        try:
+            started = time.perf_counter()
+            self._load_preview_assets(settings)
+            image_path, photographer, relative_path = self._preview_source(settings)
+            if image_path is None:
+                self.preview_queue.put(('message', generation, "No supported images found in the input folder"))
+                return
+            
+            previews = self.preview_processor.iter_previews(
+                image_path, settings['watermark_text'], [mode for mode, _ in PREVIEW_MODES], 
+                PREVIEW_SIZE, photographer, relative_path)
+            for mode, image in previews:
+                if generation != self.preview_generation:
+                    return
+                self.preview_queue.put(('image', generation, mode, image))
+            
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.preview_queue.put(('message', generation, f"{Path(image_path).name} ({elapsed_ms:.0f} ms)"))
+        except Exception as e:
+            self.preview_queue.put(('message', generation, f"Preview failed: {e}"))
+        finally:
+            self.preview_queue.put(('done',))
+            
+    def _load_preview_assets(self, settings):
+        # Reload the logo and CSV only when their paths change
+        logo_file = settings['logo_file'] if os.path.isfile(settings['logo_file']) else None
+        if logo_file != self.preview_assets['logo_file']:
+            if not (logo_file and self.preview_processor.load_logo(logo_file)):
+                self.preview_processor.logo_image = None
+            self.preview_assets['logo_file'] = logo_file
+        
+        csv_file = settings['csv_file'] if os.path.isfile(settings['csv_file']) else None
+        if csv_file != self.preview_assets['csv_file']:
+            self.preview_processor.clear_attribution_data()
+            if csv_file:
+                self.preview_processor.load_attribution_csv(csv_file)
+            self.preview_assets['csv_file'] = csv_file
+            
+    def _preview_source(self, settings):
+        """Return (image path, photographer, relative path) of the image to preview"""
+        input_folder = settings['input_folder']
+        image_path = settings['image_path']
+        if not image_path:
+            # Sample the first image of the input folder, remembered per folder
+            folder, record = self.preview_sample
+            if folder != input_folder or (record and not os.path.exists(record.path)):
+                record = next(iter(self.preview_processor.iter_images(input_folder)), None)
+                self.preview_sample = (input_folder, record)
+            if record is None:
+                return None, None, None
+            return record.path, record.photographer, record.relative_path
+        
+        # Name the photographer as a batch run would when the image is in the input folder
+        photographer = relative_path = None
+        if input_folder and os.path.isdir(input_folder):
+            relative = os.path.relpath(image_path, input_folder)
+            if not relative.startswith(os.pardir):
+                relative_path = Path(relative).as_posix()
+                parent = os.path.basename(os.path.dirname(relative))
+                photographer = parent or None
+        return image_path, photographer, relative_path
+        
+    def poll_preview_queue(self):
+        finished = False
+        try:
+            while True:
+                event = self.preview_queue.get_nowait()
+                if event[0] == 'done':
+                    finished = True
+                elif event[1] != self.preview_generation:
+                    continue
+                elif event[0] == 'image':
+                    mode, image = event[2:]
+                    # PhotoImages must be created on the main thread and kept referenced
+                    self.preview_photos[mode] = ImageTk.PhotoImage(image)
+                    self.preview_labels[mode].config(image=self.preview_photos[mode])
+                else:
+                    self.preview_status_var.set(event[2])
+        except queue.Empty:
+            pass
+        
+        if finished:
+            self.finish_preview()
+        else:
+            self.root.after(PREVIEW_POLL_MS, self.poll_preview_queue)
+            
+    def finish_preview(self):
+        self.preview_running = False
+        if self.preview_pending:
+            self.preview_pending = False
+            # A debounce timer still waiting starts it instead
+            if self.preview_after_id is None:
+                self.start_preview()
+            
     def log_status(self, message):
+        # Safe from any thread; shown on the next poll of the UI queue
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.status_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.ui_queue.put(('log', f"[{timestamp}] {message}\n"))
+        
+    def set_progress(self, text=None, value=None, maximum=None):
+        # Safe from any thread; only the latest progress of each poll is drawn
+        self.ui_queue.put(('progress', text, value, maximum))
+        
+    def call_in_ui(self, func, *args, **kwargs):
+        # Run func(*args, **kwargs) on the Tk main loop, in order with logs and progress
+        self.ui_queue.put(('call', func, args, kwargs))
+        
+    def poll_ui_queue(self):
+        try:
+            self.drain_ui_queue()
+        finally:
+            self.root.after(UI_POLL_MS, self.poll_ui_queue)
+        
+    def drain_ui_queue(self):
+        events = []
+        try:
+            while True:
+                events.append(self.ui_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        # Fold progress updates: each one supersedes those before it
+        last_progress = max((i for i, event in enumerate(events) if event[0] == 'progress'), default=-1)
+        lines = []
+        for i, event in enumerate(events):
+            if event[0] == 'log':
+                lines.append(event[1])
+            elif event[0] == 'progress':
+                if i == last_progress:
+                    self._apply_progress(*event[1:])
+            else:
+                # Flush pending lines first so calls see the log in order
+                self._append_status(lines)
+                lines = []
+                func, args, kwargs = event[1:]
+                try:
+                    func(*args, **kwargs)
+                except Exception as e:
+                    lines.append(f"💥 UI error: {e}\n")
+        self._append_status(lines)
+        
+    def _apply_progress(self, text, value, maximum):
+        if maximum is not None:
+            self.progress_bar.config(maximum=maximum)
+        if value is not None:
+            self.progress_bar.config(value=value)
+        if text is not None:
+            self.progress_var.set(text)
+        
+    def _append_status(self, lines):
+        if not lines:
+            return
+        
+        chunk = ''.join(lines)
+        if self.status_log_file:
+            self.status_log_file.write(chunk)
+        
+        # Keep only the most recent lines in the widget
+        self.status_text.insert(tk.END, chunk)
+        line_count = int(self.status_text.index('end-1c').split('.')[0]) - 1
+        if line_count > STATUS_MAX_LINES:
+            self.status_text.delete('1.0', f'{line_count - STATUS_MAX_LINES + 1}.0')
         self.status_text.see(tk.END)
-        self.root.update_idletasks()
+        
+    def open_status_log(self, parent_output_folder):
+        self.close_status_log()
+        try:
+            Path(parent_output_folder).mkdir(parents=True, exist_ok=True)
+            log_path = Path(parent_output_folder) / STATUS_LOG_FILENAME
+            self.status_log_file = open(log_path, 'a', encoding='utf-8')
+            self.status_log_file.write(f"\n=== Run started {datetime.now().isoformat(timespec='seconds')} ===\n")
+        except Exception as e:
+            self.status_log_file = None
+            self.log_status(f"❌ Could not open status log file: {str(e)}")
+        
+    def close_status_log(self):
+        if self.status_log_file:
+            self.status_log_file.close()
+            self.status_log_file = None
         
     def validate_inputs(self):
         if not self.input_folder_var.get():
@@ -185,6 +486,13 @@ class WatermarkGUI:
             messagebox.showerror("Error", "Please enter watermark text")
             return False
             
+        try:
+            if self.jobs_var.get() < 1:
+                raise ValueError
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Parallel workers must be a whole number of at least 1")
+            return False
+            
         logo_file = self.logo_file_var.get()
         if logo_file and not os.path.exists(logo_file):
             messagebox.showerror("Error", "Logo file does not exist")
@@ -200,132 +508,140 @@ class WatermarkGUI:
         self.open_normal_button.config(state='disabled')
         self.open_wm_button.config(state='disabled')
         
+        # Apply anything still queued from before, then start a fresh log
+        self.drain_ui_queue()
         self.status_text.delete(1.0, tk.END)
+        self.open_status_log(self.output_folder_var.get())
         self.log_status("🚀 Starting dual-output watermarking process...")
         
-        processing_thread = threading.Thread(target=self.process_images)
+        # Tk variables are read here, on the main thread, not by the worker
+        settings = {
+            'input_folder': self.input_folder_var.get(),
+            'parent_output_folder': self.output_folder_var.get(),
+            'watermark_text': self.watermark_var.get().strip(),
+            'csv_file': self.csv_file_var.get(),
+            'logo_file': self.logo_file_var.get(),
+            'jobs': self.jobs_var.get(),
+            'incremental': self.incremental_var.get(),
+            'encoder_profile': self.encoder_profile_var.get()
+        }
+        
+        processing_thread = threading.Thread(target=self.process_images, args=(settings,))
         processing_thread.daemon = True
         processing_thread.start()
         
-    def process_images(self):
+    def process_images(self, settings):
         try:
-            input_folder = self.input_folder_var.get()
-            parent_output_folder = self.output_folder_var.get()
-            watermark_text = self.watermark_var.get().strip()
-            csv_file = self.csv_file_var.get()
-            logo_file = self.logo_file_var.get()
-            preserve_structure = self.preserve_structure_var.get()
+            input_folder = settings['input_folder']
+            parent_output_folder = settings['parent_output_folder']
+            watermark_text = settings['watermark_text']
+            csv_file = settings['csv_file']
+            logo_file = settings['logo_file']
+            jobs = settings['jobs']
+            incremental = settings['incremental']
             
-            # Create both output folders
-            normal_output_folder = os.path.join(parent_output_folder, "output_normal")
-            wm_output_folder = os.path.join(parent_output_folder, "output_wm")
+            if not (logo_file and os.path.exists(logo_file)):
+                logo_file = None
+            if not (csv_file and os.path.exists(csv_file)):
+                csv_file = None
             
-            if logo_file and os.path.exists(logo_file):
-                if self.processor.load_logo(logo_file):
+            batch = BatchProcessor(watermark_text, logo_file, csv_file, jobs=jobs,
+                                   encoder_profile=settings['encoder_profile'])
+            self.processor = batch.processor
+            
+            if logo_file:
+                if self.processor.logo_image:
                     self.log_status(f"✅ Logo loaded successfully: {Path(logo_file).name}")
                 else:
                     self.log_status("❌ Failed to load logo, continuing without logo")
             
+            # Create both output folders
+            output_folders = batch.get_output_folders(parent_output_folder)
+            normal_output_folder = str(output_folders['normal'])
+            wm_output_folder = str(output_folders['watermarked'])
+            
             # Create output directories
             Path(normal_output_folder).mkdir(parents=True, exist_ok=True)
             Path(wm_output_folder).mkdir(parents=True, exist_ok=True)
             self.log_status(f"📁 Normal output folder created: {normal_output_folder}")
             self.log_status(f"📁 Watermarked output folder created: {wm_output_folder}")
             
-            if csv_file and os.path.exists(csv_file):
-                count = self.processor.load_attribution_csv(csv_file)
+            if csv_file:
+                count = self.processor.get_attribution_count()
                 self.log_status(f"📊 Loaded attribution data for {count} files")
+                report = self.processor.attributions.report()
+                if report['duplicates']:
+                    self.log_status(f"⚠️ Duplicate CSV entries (last one used): {', '.join(report['duplicates'][:5])}")
+                if report['ambiguous']:
+                    self.log_status(f"⚠️ File names in several folders, use paths in the CSV: "
+                                    f"{', '.join(report['ambiguous'][:5])}")
             
-            self.log_status("🔍 Scanning for images in all subfolders...")
-            image_files = self.processor.find_all_images(input_folder)
+            # Images are processed as the scan finds them; the total grows as it goes
+            self.log_status("🔍 Scanning and processing images in all subfolders...")
+            self.log_status(f"⚙️ Using {batch.jobs} worker process(es)")
+            image_files = self.processor.iter_images(input_folder)
+            photographers = set()
             
-            if not image_files:
-                self.log_status("❌ No supported image files found in input folder or subfolders")
-                messagebox.showwarning("Warning", "No supported image files found")
-                return
-                
-            self.log_status(f"🖼️ Found {len(image_files)} images to process")
-            
-            photographers = set(img['photographer'] for img in image_files if img['photographer'])
-            if photographers:
-                self.log_status(f"👥 Photographers found: {', '.join(photographers)}")
-            
-            # Double the progress bar maximum since we're processing each image twice
-            self.progress_bar.config(maximum=len(image_files) * 2)
-            
-            normal_log_path = Path(normal_output_folder) / "watermarking_log.csv"
-            wm_log_path = Path(wm_output_folder) / "watermarking_log.csv"
-            
-            success_count_normal = 0
-            success_count_wm = 0
-            
-            for i, img_info in enumerate(image_files):
-                img_file = img_info['path']
-                photographer = img_info['photographer']
-                subfolder = img_info['subfolder']
-                relative_path = img_info['relative_path']
-                
-                # Determine output paths for both versions
+            def on_progress(record, done, total):
+                img_name = Path(record['path']).name
+                photographer = record['photographer']
                 if photographer:
-                    normal_photographer_folder = Path(normal_output_folder) / photographer
-                    wm_photographer_folder = Path(wm_output_folder) / photographer
-                    normal_photographer_folder.mkdir(parents=True, exist_ok=True)
-                    wm_photographer_folder.mkdir(parents=True, exist_ok=True)
-                    normal_output_file = normal_photographer_folder / img_file.name
-                    wm_output_file = wm_photographer_folder / img_file.name
-                else:
-                    normal_output_file = Path(normal_output_folder) / img_file.name
-                    wm_output_file = Path(wm_output_folder) / img_file.name
+                    photographers.add(photographer)
                 
-                # Process normal version
-                progress_text = f"Processing Normal {i+1}/{len(image_files)}: {img_file.name}"
-                if photographer:
-                    progress_text += f" (📸 {photographer})"
-                    
-                self.progress_var.set(progress_text)
-                self.progress_bar.config(value=i*2 + 1)
-                self.root.update_idletasks()
+                if record.get('skipped'):
+                    self.set_progress(value=done, maximum=total)
+                    self.log_status(f"⏭️ Unchanged, skipped: {record['key']}")
+                    return
                 
-                self.log_status(f"⚡ Processing Normal: {img_file.name}" + (f" by {photographer}" if photographer else ""))
-                
-                if self.processor.add_watermark(str(img_file), str(normal_output_file), 
-                                            watermark_text, str(normal_log_path), 
-                                            photographer, subfolder, watermark_mode='normal'):
-                    success_count_normal += 1
-                    self.log_status(f"✅ Normal saved: {normal_output_file.relative_to(Path(normal_output_folder))}")
-                else:
-                    self.log_status(f"❌ Normal failed: {img_file.name}")
-                
-                # Process watermarked version
-                progress_text = f"Processing Watermarked {i+1}/{len(image_files)}: {img_file.name}"
+                progress_text = f"Processed {done}/{total}: {img_name}"
                 if photographer:
                     progress_text += f" (📸 {photographer})"
                     
-                self.progress_var.set(progress_text)
-                self.progress_bar.config(value=i*2 + 2)
-                self.root.update_idletasks()
-                
-                self.log_status(f"🔒 Processing Watermarked: {img_file.name}" + (f" by {photographer}" if photographer else ""))
+                self.set_progress(progress_text, done, total)
                 
-                if self.processor.add_watermark(str(img_file), str(wm_output_file), 
-                                            watermark_text, str(wm_log_path), 
-                                            photographer, subfolder, watermark_mode='watermarked'):
-                    success_count_wm += 1
-                    self.log_status(f"✅ Watermarked saved: {wm_output_file.relative_to(Path(wm_output_folder))}")
-                else:
-                    self.log_status(f"❌ Watermarked failed: {img_file.name}")
+                for result in record['results']:
+                    label = "Normal" if result['mode'] == 'normal' else "Watermarked"
+                    if result['success']:
+                        output_root = Path(normal_output_folder if result['mode'] == 'normal' else wm_output_folder)
+                        self.log_status(f"✅ {label} saved: {Path(result['output_path']).relative_to(output_root)}")
+                    else:
+                        self.log_status(f"❌ {label} failed: {img_name}")
+            
+            summary = batch.run(image_files, parent_output_folder, progress_callback=on_progress,
+                                incremental=incremental)
+            success_count_normal = summary['succeeded']['normal']
+            success_count_wm = summary['succeeded']['watermarked']
+            total_images = summary['total']
+            
+            if not total_images:
+                self.log_status("❌ No supported image files found in input folder or subfolders")
+                self.call_in_ui(messagebox.showwarning, "Warning", "No supported image files found")
+                return
             
-            self.progress_var.set(f"🎉 Complete! Normal: {success_count_normal}/{len(image_files)}, Watermarked: {success_count_wm}/{len(image_files)}")
+            self.log_status(f"🖼️ Found {total_images} images")
+            if photographers:
+                self.log_status(f"👥 Photographers found: {', '.join(sorted(photographers))}")
+            
+            self.set_progress(f"🎉 Complete! Normal: {success_count_normal}/{total_images}, Watermarked: {success_count_wm}/{total_images}")
             self.log_status(f"🎊 Processing complete!")
-            self.log_status(f"📊 Normal version: {success_count_normal}/{len(image_files)} images")
-            self.log_status(f"📊 Watermarked version: {success_count_wm}/{len(image_files)} images")
+            self.log_status(f"📊 Normal version: {success_count_normal}/{total_images} images")
+            self.log_status(f"📊 Watermarked version: {success_count_wm}/{total_images} images")
+            if summary['skipped']:
+                self.log_status(f"⏭️ Skipped (unchanged since last run): {summary['skipped']} images")
+            if summary['decode_scales']:
+                scales = ', '.join(f"{name}: {count}" for name, count in sorted(summary['decode_scales'].items()))
+                self.log_status(f"🧮 Decode downscales: {scales}")
+            for image_format, totals in sorted(summary['encoding']['formats'].items()):
+                self.log_status(f"💾 {image_format} ({summary['encoding']['profile']}): {totals['count']} files, "
+                                f"{totals['time']:.2f}s encoding, {totals['bytes'] / (1024 * 1024):.2f} MB")
             self.log_status(f"📁 Normal output: {normal_output_folder}")
             self.log_status(f"📁 Watermarked output: {wm_output_folder}")
             
-            messagebox.showinfo("Complete", 
+            self.call_in_ui(messagebox.showinfo, "Complete", 
                             f"Dual watermarking complete! 🎉\n\n"
-                            f"Normal version: {success_count_normal}/{len(image_files)} images\n"
-                            f"Watermarked version: {success_count_wm}/{len(image_files)} images\n\n"
+                            f"Normal version: {success_count_normal}/{total_images} images\n"
+                            f"Watermarked version: {success_count_wm}/{total_images} images\n"
+                            f"Skipped (unchanged): {summary['skipped']} images\n\n"
                             f"Output folders:\n"
                             f"• Normal: {normal_output_folder}\n"
                             f"• Watermarked: {wm_output_folder}\n\n"
@@ -335,16 +651,20 @@ class WatermarkGUI:
             
             self.actual_normal_folder = normal_output_folder
             self.actual_wm_folder = wm_output_folder
-            self.open_normal_button.config(state='normal')
-            self.open_wm_button.config(state='normal')
+            self.call_in_ui(self.open_normal_button.config, state='normal')
+            self.call_in_ui(self.open_wm_button.config, state='normal')
             
         except Exception as e:
             self.log_status(f"💥 Error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            self.call_in_ui(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
         finally:
-            self.start_button.config(state='normal')
-            self.progress_bar.config(value=0)
-            self.progress_var.set("Ready to start watermarking...")
+            self.call_in_ui(self.finish_processing)
+            
+    def finish_processing(self):
+        self.start_button.config(state='normal')
+        self.progress_bar.config(value=0)
+        self.progress_var.set("Ready to start watermarking...")
+        self.close_status_log()
             
     def open_normal_folder(self):
         if hasattr(self, 'actual_normal_folder') and self.actual_normal_folder and os.path.exists(self.actual_normal_folder):
@@ -0,0 +1,121 @@
+import json
+import math
+import os
+import threading
+import time
+
+
+class StageTimer:
+    """Times one stage of one image and reports it to a hook when the block exits"""
+    __slots__ = ('hook', 'image', 'stage', 'start', 'bytes')
+
+    def __init__(self, hook, image, stage):
+        self.hook = hook
+        self.image = image
+        self.stage = stage
+        self.bytes = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+        self.hook({
+            'image': self.image,
+            'stage': self.stage,
+            'start': self.start,
+            'duration': duration,
+            'bytes': self.bytes,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        })
+        return False
+
+
+class _NullStage:
+    """Shared do-nothing stand-in for StageTimer when instrumentation is off"""
+    __slots__ = ('bytes',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class StageRecorder:
+    """Collects stage events from WatermarkProcessor.stage_hook and summarises them.
+
+    Use an instance directly as the hook (it is callable), or feed it events that
+    were gathered elsewhere (e.g. in worker processes) with add_events().
+    """
+
+    def __init__(self, keep_events=False):
+        self.keep_events = keep_events
+        self.events = []
+        self._durations = {}
+        self._bytes = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        self.add_events([event])
+
+    def add_events(self, events):
+        with self._lock:
+            for event in events:
+                stage = event['stage']
+                self._durations.setdefault(stage, []).append(event['duration'])
+                if event.get('bytes'):
+                    self._bytes[stage] = self._bytes.get(stage, 0) + event['bytes']
+                if self.keep_events:
+                    self.events.append(event)
+
+    def summary(self):
+        """Per-stage count, total, mean and p95 wall time (seconds) and bytes"""
+        with self._lock:
+            summary = {}
+            for stage, durations in self._durations.items():
+                ordered = sorted(durations)
+                p95_index = min(len(ordered) - 1, max(0, math.ceil(0.95 * len(ordered)) - 1))
+                summary[stage] = {
+                    'count': len(ordered),
+                    'total': sum(ordered),
+                    'mean': sum(ordered) / len(ordered),
+                    'p95': ordered[p95_index],
+                    'bytes': self._bytes.get(stage, 0)
+                }
+            return summary
+
+    def format_table(self):
+        """Render the summary as a fixed-width text table, slowest stage first"""
+        summary = self.summary()
+        lines = [f"{'stage':<12}{'count':>7}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}{'MB':>10}"]
+        for stage, stats in sorted(summary.items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{stage:<12}{stats['count']:>7}{stats['total']:>10.2f}"
+                         f"{stats['mean'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}"
+                         f"{stats['bytes'] / (1024 * 1024):>10.1f}")
+        return '\n'.join(lines)
+
+    def write_trace(self, trace_path):
+        """Write kept events in Chrome trace format (chrome://tracing, Perfetto)"""
+        with self._lock:
+            events = list(self.events)
+
+        origin = min((event['start'] for event in events), default=0.0)
+        trace_events = [{
+            'name': event['stage'],
+            'cat': 'watermark',
+            'ph': 'X',
+            'ts': (event['start'] - origin) * 1e6,
+            'dur': event['duration'] * 1e6,
+            'pid': event.get('pid', 0),
+            'tid': event.get('tid', 0),
+            'args': {'image': str(event['image']), 'bytes': event.get('bytes')}
+        } for event in events]
+
+        with open(trace_path, 'w', encoding='utf-8') as file:
+            json.dump({'traceEvents': trace_events}, file)
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache with hit/miss counters.
+
+    Entries are limited by count and, when max_bytes is set, by the total of
+    the sizes given to put(); the least recently used entries are evicted
+    first.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key (marking it recently used) or default"""
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size=0):
+        """Store a value taking size bytes, evicting the least recently used entries beyond the limits.
+
+        A value larger than max_bytes on its own is not stored.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def __len__(self):
+        return len(self._entries)
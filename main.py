@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
-import tkinter as tk
-from tkinter import ttk
-from gui import WatermarkGUI
+import multiprocessing
+import sys
+
+def launch_gui():
+    # Tk is only imported for the GUI so the command-line path stays headless
+    import tkinter as tk
+    from tkinter import ttk
+    from gui import WatermarkGUI
 
-def main():
     root = tk.Tk()
     
     style = ttk.Style()
@@ -31,5 +35,15 @@ def main():
     root.minsize(600, 500)
     root.mainloop()
 
+def main():
+    # Any command-line arguments select the headless batch CLI
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    launch_gui()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Needed for the batch worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    main()
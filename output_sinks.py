@@ -0,0 +1,145 @@
+import abc
+import io
+import os
+import tarfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from encoder_profiles import get_output_format
+
+# Already-compressed formats are stored as they are; deflating them again
+# costs time on the single writer for next to no saving
+STORED_FORMATS = ('JPEG', 'WEBP', 'PNG', 'GIF')
+
+
+class FileSystemSink:
+    """Write each encoded output to its own file at its output path"""
+
+    def write(self, output_path, data):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'wb') as file:
+            file.write(data)
+
+
+class ArchiveSink(abc.ABC):
+    """Stream encoded outputs into one archive instead of separate files.
+
+    Entries are named by their output path relative to root, so the
+    'output_normal/<photographer>/...' layout is kept inside the archive.
+    write() is thread-safe: the pipeline's write-behind threads, fed by any
+    number of encoders, take turns on a lock because zip and tar entries
+    cannot be interleaved. The archive is built as '<name>.part' and only
+    renamed into place by close(), so an archive under its final name is
+    always complete; abort() deletes it instead.
+    """
+
+    extension = None
+
+    def __init__(self, archive_path, root):
+        self.archive_path = Path(archive_path)
+        self.root = Path(root)
+        self.entries = 0
+        self.bytes_written = 0
+
+        self._partial_path = self.archive_path.with_name(self.archive_path.name + '.part')
+        self._lock = threading.Lock()
+        self._closed = False
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self._open(self._partial_path)
+
+    def arcname(self, output_path):
+        """Entry name of an output path, relative to the archive root"""
+        return Path(output_path).relative_to(self.root).as_posix()
+
+    def write(self, output_path, data):
+        """Add the encoded bytes of one output"""
+        self._write_entry(self.arcname(output_path), data,
+                          get_output_format(output_path) in STORED_FORMATS)
+
+    def add_file(self, path, arcname):
+        """Add an existing file (e.g. an attribution log) under arcname"""
+        with open(path, 'rb') as file:
+            self._write_entry(arcname, file.read(), False)
+
+    def _write_entry(self, arcname, data, stored):
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"Archive is closed: {self.archive_path}")
+            self._add(arcname, data, stored)
+            self.entries += 1
+            self.bytes_written += len(data)
+
+    def close(self):
+        """Finish the archive and move it into place; safe to call more than once"""
+        with self._lock:
+            if self._closed:
+                return
+            self._close()
+            self._closed = True
+            os.replace(self._partial_path, self.archive_path)
+
+    def abort(self):
+        """Close and delete an unfinished archive"""
+        with self._lock:
+            if self._closed:
+                return
+            self._close()
+            self._closed = True
+            os.remove(self._partial_path)
+
+    @abc.abstractmethod
+    def _open(self, path):
+        """Create the archive file at path"""
+
+    @abc.abstractmethod
+    def _add(self, arcname, data, stored):
+        """Append one entry; stored asks for no compression"""
+
+    @abc.abstractmethod
+    def _close(self):
+        """Finish writing the archive file"""
+
+
+class ZipSink(ArchiveSink):
+    """ZIP archive; stored formats are kept as they are and the rest deflated"""
+
+    extension = '.zip'
+
+    def _open(self, path):
+        self._archive = zipfile.ZipFile(path, 'w', allowZip64=True)
+
+    def _add(self, arcname, data, stored):
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        self._archive.writestr(info, data)
+
+    def _close(self):
+        self._archive.close()
+
+
+class TarSink(ArchiveSink):
+    """Uncompressed tar archive, written entry by entry"""
+
+    extension = '.tar'
+
+    def _open(self, path):
+        self._archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT)
+
+    def _add(self, arcname, data, stored):
+        info = tarfile.TarInfo(arcname)
+        info.size = len(data)
+        info.mtime = time.time()
+        info.mode = 0o644
+        self._archive.addfile(info, io.BytesIO(data))
+
+    def _close(self):
+        self._archive.close()
+
+
+ARCHIVE_SINKS = {
+    'zip': ZipSink,
+    'tar': TarSink
+}
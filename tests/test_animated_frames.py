@@ -0,0 +1,129 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import animated_frames
+import watermark_processor
+from animated_frames import encode_streams, iter_rendered
+from watermark_processor import WatermarkProcessor
+
+DURATIONS = [40, 80, 120, 160, 200, 240]
+FRAME_SIZE = (320, 240)
+
+
+def _frames():
+    """Frames with a fully transparent left strip and a moving colored square"""
+    frames = []
+    for index in range(len(DURATIONS)):
+        frame = Image.new('RGBA', FRAME_SIZE, (30, 60, 90, 255))
+        frame.paste((0, 0, 0, 0), (0, 0, 40, FRAME_SIZE[1]))
+        frame.paste((220, 40 * index, 40, 255), (60 + 30 * index, 80, 120 + 30 * index, 140))
+        frames.append(frame)
+    return frames
+
+
+def _save_animation(path, format):
+    frames = _frames()
+    if format == 'GIF':
+        frames = [frame.convert('P', palette=Image.Palette.ADAPTIVE) for frame in frames]
+        # ADAPTIVE drops alpha; mark the strip's palette entry as transparent
+        for frame in frames:
+            frame.info['transparency'] = frame.getpixel((0, 0))
+    frames[0].save(path, format, save_all=True, append_images=frames[1:], duration=DURATIONS,
+                   loop=3, disposal=2)
+
+
+def _read_animation(path):
+    """n_frames, per-frame durations, loop count and whether each frame has transparent pixels"""
+    with Image.open(path) as image:
+        durations, transparent = [], []
+        for index in range(image.n_frames):
+            image.seek(index)
+            # The WebP plugin sets a frame's duration when it is loaded
+            image.load()
+            durations.append(image.info['duration'])
+            alpha = image.convert('RGBA').getchannel('A')
+            transparent.append(alpha.getextrema()[0] == 0)
+        return image.n_frames, durations, image.info.get('loop'), transparent
+
+
+@pytest.mark.parametrize('format, extension', [('GIF', '.gif'), ('WEBP', '.webp')])
+@pytest.mark.parametrize('frame_threads', [1, 2])
+def test_render_variants_keeps_animation(tmp_path, monkeypatch, format, extension, frame_threads):
+    decoded = []
+
+    def counting_frames(source):
+        for frame in animated_frames.iter_frames(source):
+            decoded.append(frame)
+            yield frame
+
+    monkeypatch.setattr(watermark_processor, 'iter_frames', counting_frames)
+    source_path = tmp_path / f'source{extension}'
+    _save_animation(source_path, format)
+    source = _read_animation(source_path)
+    assert source == (len(DURATIONS), DURATIONS, 3, [True] * len(DURATIONS))
+
+    processor = WatermarkProcessor(frame_threads=frame_threads)
+    variants = [{'mode': mode, 'output_path': tmp_path / f'{mode}{extension}'}
+                for mode in ('normal', 'watermarked')]
+    results = processor.render_variants(str(source_path), variants, 'TEST', attribution={})
+
+    # Both variants come from a single pass over the source frames
+    assert len(decoded) == len(DURATIONS)
+    for variant, result in zip(variants, results):
+        assert result['success'], result.get('error')
+        assert result['frames'] == len(DURATIONS)
+        assert _read_animation(variant['output_path']) == source
+
+
+def test_iter_rendered_keeps_order():
+    def render(frame):
+        return frame * 10
+
+    assert list(iter_rendered(iter(range(20)), render)) == [frame * 10 for frame in range(20)]
+    with ThreadPoolExecutor(3) as executor:
+        assert list(iter_rendered(iter(range(20)), render, executor, chunk_frames=2)) == \
+            [frame * 10 for frame in range(20)]
+
+
+def test_encode_streams_one_pass_to_each_encoder():
+    produced = []
+    received = {0: [], 1: []}
+    threads = set()
+
+    def frame_sets():
+        for index in range(20):
+            produced.append(index)
+            yield (f'a{index}', f'b{index}')
+
+    def encoder(index):
+        def encode(first, rest):
+            threads.add(threading.current_thread().name)
+            received[index] = [first] + list(rest)
+        return encode
+
+    errors = encode_streams(frame_sets(), [encoder(0), encoder(1)], buffer_frames=2)
+
+    assert errors == [None, None]
+    assert produced == list(range(20))
+    assert received == {0: [f'a{index}' for index in range(20)], 1: [f'b{index}' for index in range(20)]}
+    assert threads == {'wm-encode-0', 'wm-encode-1'}
+
+
+def test_encode_streams_failed_encoder_does_not_stop_others():
+    def failing(first, rest):
+        next(rest)
+        raise OSError('encoder failed')
+
+    received = []
+
+    def collecting(first, rest):
+        received.extend([first] + list(rest))
+
+    errors = encode_streams(((index, index) for index in range(50)), [failing, collecting], buffer_frames=1)
+
+    assert isinstance(errors[0], OSError)
+    assert errors[1] is None
+    assert received == list(range(50))
@@ -0,0 +1,40 @@
+import csv
+
+import pytest
+
+from attribution_log import LOG_FIELDNAMES, AttributionLogWriter
+
+
+def _row(index):
+    return {field: f'{field}-{index}' for field in LOG_FIELDNAMES}
+
+
+def _read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+def test_close_writes_buffered_rows(tmp_path):
+    log_path = tmp_path / 'log.csv'
+    writer = AttributionLogWriter(str(log_path), flush_rows=1000, flush_interval=3600)
+    writer.write_rows([_row(index) for index in range(250)])
+    writer.write_row(_row(250))
+
+    # Nothing has reached the file yet, only the header
+    assert _read_rows(log_path) == []
+    writer.close()
+    writer.close()
+
+    assert _read_rows(log_path) == [_row(index) for index in range(251)]
+    assert writer.rows_written == 251
+    with pytest.raises(ValueError):
+        writer.write_row(_row(251))
+
+
+def test_appends_without_repeating_header(tmp_path):
+    log_path = tmp_path / 'log.csv'
+    for start in (0, 3):
+        with AttributionLogWriter(str(log_path), flush_rows=2) as writer:
+            writer.write_rows([_row(index) for index in range(start, start + 3)])
+
+    assert _read_rows(log_path) == [_row(index) for index in range(6)]
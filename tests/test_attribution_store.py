@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from attribution_store import AttributionStore
+
+HEADER = "filename,team_name,caption,photographer\n"
+
+
+def _write_csv(path, rows, mtime_ns=None):
+    path.write_text(HEADER + ''.join(f"{row}\n" for row in rows), encoding='utf-8')
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def _load(tmp_path, rows, use_index):
+    csv_path = tmp_path / 'attribution.csv'
+    _write_csv(csv_path, rows)
+    store = AttributionStore()
+    store.load(csv_path, use_index=use_index, index_path=str(tmp_path / 'index.sqlite'))
+    return store
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_relative_path_first(tmp_path, use_index):
+    store = _load(tmp_path, [
+        "x.jpg,Bare,bare caption,",
+        "alice/x.jpg,Alice,alice caption,Alice A",
+        "carol/x.jpg,Carol,carol caption,Carol C"
+    ], use_index)
+
+    assert store.lookup('alice/x.jpg', 'x.jpg')['team_name'] == 'Alice'
+    assert store.lookup('CAROL\\X.JPG', 'X.JPG')['team_name'] == 'Carol'
+    # Other folders and the top level fall back to the bare file name row
+    assert store.lookup('dave/x.jpg', 'x.jpg')['team_name'] == 'Bare'
+    assert store.lookup('x.jpg', 'x.jpg')['team_name'] == 'Bare'
+    assert store.lookup('dave/y.jpg', 'y.jpg') == {}
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_no_file_name_fallback_across_folders(tmp_path, use_index):
+    store = _load(tmp_path, ["carol/x.jpg,Carol,carol caption,Carol C"], use_index)
+
+    assert store.report()['indexed'] == use_index
+    assert store.lookup('carol/x.jpg', 'x.jpg')['team_name'] == 'Carol'
+    assert store.lookup('dave/x.jpg', 'x.jpg') == {}
+    assert store.lookup('x.jpg', 'x.jpg') == {}
+    # A lookup by file name alone still finds the only path row with that name
+    assert store.lookup(None, 'x.jpg')['team_name'] == 'Carol'
+
+
+def test_index_rebuilt_when_csv_changes(tmp_path):
+    csv_path = tmp_path / 'attribution.csv'
+    index_path = str(tmp_path / 'index.sqlite')
+    _write_csv(csv_path, ["a.jpg,Team One,caption,"], mtime_ns=1_000_000_000)
+    store = AttributionStore()
+    store.load(csv_path, use_index=True, index_path=index_path)
+    built = os.stat(index_path).st_mtime_ns
+
+    # An unchanged CSV reuses the index and refresh() has nothing to do
+    reopened = AttributionStore()
+    reopened.load(csv_path, use_index=True, index_path=index_path)
+    assert os.stat(index_path).st_mtime_ns == built
+    assert not store.refresh()
+
+    # Same size, new mtime
+    _write_csv(csv_path, ["a.jpg,Team Two,caption,"], mtime_ns=2_000_000_000)
+    assert store.refresh()
+    assert store.lookup('a.jpg')['team_name'] == 'Team Two'
+
+    # New size, same mtime
+    _write_csv(csv_path, ["a.jpg,Team Three,caption,"], mtime_ns=2_000_000_000)
+    assert store.refresh()
+    assert store.lookup('a.jpg')['team_name'] == 'Team Three'
+    assert len(store) == 1
+
+
+@pytest.mark.parametrize('use_index', [False, True])
+def test_duplicates_and_ambiguous_reported(tmp_path, use_index):
+    store = _load(tmp_path, [
+        "a.jpg,First,,",
+        "A.JPG,Second,,",
+        "alice/b.jpg,Alice,,",
+        "carol/b.jpg,Carol,,",
+        "alice/c.jpg,Alice,,",
+        "carol/c.jpg,Carol,,",
+        "c.jpg,Bare,,"
+    ], use_index)
+
+    report = store.report()
+    assert report['entries'] == 6
+    assert report['duplicates'] == ['a.jpg']
+    # c.jpg has a bare row to fall back to, so only b.jpg is ambiguous
+    assert report['ambiguous'] == ['b.jpg']
+    assert store.lookup('a.jpg')['team_name'] == 'Second'
+    assert store.lookup(None, 'b.jpg') == {}
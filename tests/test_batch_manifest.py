@@ -0,0 +1,53 @@
+import os
+
+from PIL import Image
+
+from batch_processor import BatchProcessor
+
+CSV_HEADER = "filename,team_name,caption,photographer\n"
+
+
+def _run(batch, input_folder, output_folder):
+    """Run incrementally; returns the summary and the relative paths that were rendered"""
+    rendered = []
+
+    def on_progress(record, done, total):
+        if not record.get('skipped'):
+            rendered.append(record['key'])
+
+    summary = batch.run(batch.processor.iter_images(input_folder), output_folder,
+                        progress_callback=on_progress, incremental=True)
+    return summary, sorted(rendered)
+
+
+def test_unchanged_images_are_skipped(tmp_path):
+    input_folder = tmp_path / 'in'
+    output_folder = tmp_path / 'out'
+    (input_folder / 'alice').mkdir(parents=True)
+    for name, color in (('a.jpg', 'red'), ('b.jpg', 'green'), ('c.jpg', 'blue'), ('d.jpg', 'gray')):
+        Image.new('RGB', (320, 240), color).save(input_folder / 'alice' / name)
+    csv_path = tmp_path / 'attribution.csv'
+    csv_path.write_text(CSV_HEADER + "alice/a.jpg,Team A,,\nalice/b.jpg,Team B,,\n", encoding='utf-8')
+
+    batch = BatchProcessor('TEST', csv_path=str(csv_path), jobs=1)
+    summary, rendered = _run(batch, input_folder, output_folder)
+    assert rendered == ['alice/a.jpg', 'alice/b.jpg', 'alice/c.jpg', 'alice/d.jpg']
+    assert summary['skipped'] == 0
+
+    summary, rendered = _run(batch, input_folder, output_folder)
+    assert rendered == []
+    assert summary['skipped'] == 4
+
+    # Touch one source, change one attribution row and delete one output
+    stat = os.stat(input_folder / 'alice' / 'a.jpg')
+    os.utime(input_folder / 'alice' / 'a.jpg', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    csv_path.write_text(CSV_HEADER + "alice/a.jpg,Team A,,\nalice/b.jpg,Team Bee,,\n", encoding='utf-8')
+    os.remove(output_folder / 'output_wm' / 'alice' / 'c.jpg')
+
+    summary, rendered = _run(batch, input_folder, output_folder)
+    assert rendered == ['alice/a.jpg', 'alice/b.jpg', 'alice/c.jpg']
+    assert summary['skipped'] == 1
+    assert (output_folder / 'output_wm' / 'alice' / 'c.jpg').exists()
+
+    summary, rendered = _run(batch, input_folder, output_folder)
+    assert rendered == []
@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import batch_pipeline
+from batch_pipeline import StagedPipeline, read_source
+
+FILE_BYTES = 1000
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = []
+    for index in range(6):
+        path = tmp_path / f'{index}.jpg'
+        path.write_bytes(bytes([index]) * FILE_BYTES)
+        paths.append(path)
+    return paths
+
+
+def _tasks(paths, output_folder):
+    return [{'key': path.name, 'path': str(path), 'output_path': str(output_folder / path.name)}
+            for path in paths]
+
+
+def _on_error(task, error):
+    return {'key': task['key'], 'error': str(error), 'results': []}
+
+
+def _run(pipeline, tasks, render_seconds=0.0):
+    """Run the pipeline with a single render thread; returns its records by key"""
+    with ThreadPoolExecutor(1) as renderer:
+        def render(task):
+            time.sleep(render_seconds)
+            result = {'mode': 'normal', 'success': True, 'output_path': task['output_path'],
+                      'data': task['source'][:10]}
+            return {'key': task['key'], 'results': [result]}
+
+        pipeline.submit_render = lambda task: renderer.submit(render, task)
+        return {record['key']: record for record in pipeline.run(tasks)}
+
+
+def test_read_source_hashes_only_on_request(sources):
+    data, source_info = read_source(str(sources[0]))
+    assert data == sources[0].read_bytes()
+    assert source_info == {'size': FILE_BYTES, 'mtime_ns': sources[0].stat().st_mtime_ns}
+
+    _, source_info = read_source(str(sources[0]), with_hash=True)
+    assert source_info['sha1'] == hashlib.sha1(data).hexdigest()
+
+
+def test_inflight_cap_limits_read_ahead(tmp_path, sources, monkeypatch):
+    lock = threading.Lock()
+    pipeline = StagedPipeline(None, _on_error, max_render_pending=len(sources),
+                              max_inflight_bytes=int(FILE_BYTES * 2.5))
+    inflight = []
+
+    def counting_read(path, with_hash=False):
+        with lock:
+            inflight.append(pipeline.inflight_bytes)
+        return read_source(path, with_hash)
+
+    monkeypatch.setattr(batch_pipeline, 'read_source', counting_read)
+    records = _run(pipeline, _tasks(sources, tmp_path), render_seconds=0.05)
+
+    assert len(records) == len(sources)
+    assert all(record['results'][0]['success'] for record in records.values())
+    # Without the cap all six files would be read while the first one renders
+    assert max(inflight) <= pipeline.max_inflight_bytes
+    assert pipeline.depth_stats()['read']['max'] <= 2
+    assert pipeline.inflight_bytes == 0
+
+
+def test_file_larger_than_cap_still_read(tmp_path, sources):
+    pipeline = StagedPipeline(None, _on_error, max_inflight_bytes=FILE_BYTES // 2)
+
+    records = _run(pipeline, _tasks(sources, tmp_path))
+
+    assert sorted(records) == sorted(path.name for path in sources)
+    assert pipeline.depth_stats()['read']['max'] == 1
+
+
+class FailingSink:
+    def __init__(self, failing_name):
+        self.failing_name = failing_name
+        self.written = []
+
+    def write(self, output_path, data):
+        if output_path.endswith(self.failing_name):
+            raise OSError('disk full')
+        self.written.append(output_path)
+
+
+def test_write_failure_fails_only_its_image(tmp_path, sources):
+    sink = FailingSink('2.jpg')
+    pipeline = StagedPipeline(None, _on_error, sinks={'normal': sink})
+
+    records = _run(pipeline, _tasks(sources, tmp_path))
+
+    assert len(records) == len(sources)
+    failed = records['2.jpg']['results'][0]
+    assert not failed['success']
+    assert failed['error'] == 'disk full'
+    assert all(records[path.name]['results'][0]['success'] for path in sources if path.name != '2.jpg')
+    assert len(sink.written) == len(sources) - 1
@@ -0,0 +1,49 @@
+import csv
+
+import pytest
+from PIL import Image
+
+from batch_processor import LOG_FILENAME, BatchProcessor
+
+IMAGES = ('alice/a.jpg', 'alice/b.png', 'bob/c.jpg', 'bob/d.webp', 'e.jpg')
+
+
+@pytest.fixture
+def input_folder(tmp_path):
+    folder = tmp_path / 'in'
+    for index, relative_path in enumerate(IMAGES):
+        path = folder / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (320 + index * 40, 240), (40 * index, 90, 160)).save(path)
+    (folder / 'bob' / 'broken.jpg').write_bytes(b'\xff\xd8not a jpeg')
+    return folder
+
+
+def _read_log(path):
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return list(csv.DictReader(file))
+
+
+@pytest.mark.parametrize('pipeline', [True, False])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_processes_tree(tmp_path, input_folder, jobs, pipeline):
+    output_folder = tmp_path / 'out'
+    batch = BatchProcessor('TEST', jobs=jobs, pipeline=pipeline)
+    records = []
+
+    summary = batch.run(batch.processor.iter_images(input_folder), output_folder,
+                        progress_callback=lambda record, done, total: records.append(record))
+
+    assert summary['total'] == len(IMAGES) + 1
+    assert summary['succeeded'] == {'normal': len(IMAGES), 'watermarked': len(IMAGES)}
+    assert sorted((failure['key'], failure['mode']) for failure in summary['failed']) == [
+        ('bob/broken.jpg', 'normal'), ('bob/broken.jpg', 'watermarked')]
+    assert len(records) == len(IMAGES) + 1
+
+    for folder in ('output_normal', 'output_wm'):
+        rows = _read_log(output_folder / folder / LOG_FILENAME)
+        # One row per rendered image, written by the parent process alone
+        assert len(rows) == len(IMAGES)
+        assert len({row['input_file'] for row in rows}) == len(IMAGES)
+        for relative_path in IMAGES:
+            assert (output_folder / folder / relative_path).exists()
@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+
+import benchmark
+
+
+def _run_child(monkeypatch, target, args):
+    """Run target(*args) in a spawned process; returns its reported result and exit code"""
+    monkeypatch.setattr(benchmark, 'RESULT_POLL_SECONDS', 0.1)
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=target or result_queue.put, args=args)
+    process.start()
+    result = benchmark.wait_for_result(process, result_queue)
+    process.join()
+    return result, process.exitcode
+
+
+def test_wait_for_result_returns_reported_result(monkeypatch):
+    assert _run_child(monkeypatch, None, ({'images_per_s': 2.0},)) == ({'images_per_s': 2.0}, 0)
+
+
+def test_wait_for_result_stops_when_process_dies(monkeypatch):
+    # As if killed by the OOM killer before it could report
+    assert _run_child(monkeypatch, os._exit, (9,)) == (None, 9)
+
+
+def _run(mode, images_per_s=None, error=None, repeat=0):
+    run = {'mode': mode, 'jobs': 1, 'profile': 'balanced', 'repeat': repeat}
+    if error:
+        run.update({'error': error, 'exitcode': -9})
+    else:
+        run.update({'images_per_s': images_per_s, 'p95_ms': 100.0})
+    return run
+
+
+def test_failed_runs_are_reported_not_compared():
+    baseline = {'runs': [_run('normal', 10.0), _run('watermarked', 10.0)]}
+    current = {'runs': [
+        _run('normal', error='process exited with code -9 before reporting'),
+        _run('normal', error='process exited with code -9 before reporting', repeat=1),
+        _run('watermarked', error='MemoryError: ', repeat=0),
+        _run('watermarked', 9.5, repeat=1)
+    ]}
+
+    assert list(benchmark.best_runs(current)) == [('watermarked', 1, 'balanced')]
+    assert len(benchmark.failed_runs(current)) == 3
+    assert benchmark.compare(baseline, current, 0.10) == [
+        'normal jobs=1 profile=balanced: failed (process exited with code -9 before reporting)']
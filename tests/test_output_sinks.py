@@ -0,0 +1,75 @@
+import csv
+import io
+import tarfile
+import zipfile
+
+import pytest
+from PIL import Image
+
+from batch_processor import LOG_FILENAME, BatchProcessor
+
+IMAGES = ('alice/a.jpg', 'alice/b.png', 'bob/c.webp', 'bob/d.gif', 'bob/e.tiff', 'f.bmp')
+STORED = ('alice/a.jpg', 'alice/b.png', 'bob/c.webp', 'bob/d.gif')
+
+
+@pytest.fixture
+def input_folder(tmp_path):
+    folder = tmp_path / 'in'
+    for index, relative_path in enumerate(IMAGES):
+        path = folder / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (320, 240), (40 * index, 90, 160)).save(path)
+    return folder
+
+
+def _run(input_folder, output_folder, archive, progress_callback=None):
+    batch = BatchProcessor('TEST', jobs=1, archive=archive)
+    return batch.run(batch.processor.iter_images(input_folder), output_folder,
+                     progress_callback=progress_callback)
+
+
+def test_zip_entries(tmp_path, input_folder):
+    output_folder = tmp_path / 'out'
+    summary = _run(input_folder, output_folder, 'zip')
+
+    archive_path = output_folder / 'output_wm.zip'
+    assert summary['archives']['watermarked']['path'] == str(archive_path)
+    assert summary['archives']['watermarked']['entries'] == len(IMAGES) + 1
+    with zipfile.ZipFile(archive_path) as archive:
+        infos = {info.filename: info for info in archive.infolist()}
+        assert sorted(infos) == sorted([f'output_wm/{path}' for path in IMAGES] +
+                                       [f'output_wm/{LOG_FILENAME}'])
+        for relative_path in IMAGES:
+            expected = zipfile.ZIP_STORED if relative_path in STORED else zipfile.ZIP_DEFLATED
+            assert infos[f'output_wm/{relative_path}'].compress_type == expected
+        with Image.open(io.BytesIO(archive.read('output_wm/alice/a.jpg'))) as image:
+            assert image.format == 'JPEG'
+        log = archive.read(f'output_wm/{LOG_FILENAME}').decode('utf-8')
+        assert len(list(csv.DictReader(io.StringIO(log)))) == len(IMAGES)
+
+    # Nothing is left outside the archives
+    assert sorted(path.name for path in output_folder.iterdir()) == ['output_normal.zip', 'output_wm.zip']
+
+
+def test_tar_entries(tmp_path, input_folder):
+    output_folder = tmp_path / 'out'
+    _run(input_folder, output_folder, 'tar')
+
+    with tarfile.open(output_folder / 'output_normal.tar') as archive:
+        assert sorted(archive.getnames()) == sorted([f'output_normal/{path}' for path in IMAGES] +
+                                                    [f'output_normal/{LOG_FILENAME}'])
+
+
+@pytest.mark.parametrize('archive', ['zip', 'tar'])
+def test_aborted_run_leaves_no_archive(tmp_path, input_folder, archive):
+    output_folder = tmp_path / 'out'
+
+    def cancel(record, done, total):
+        if done == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        _run(input_folder, output_folder, archive, progress_callback=cancel)
+
+    # Neither the .part archives nor their logs survive
+    assert list(output_folder.iterdir()) == []
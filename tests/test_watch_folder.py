@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from PIL import Image
+
+from batch_processor import BatchProcessor
+from watch_folder import RETRY_SECONDS, FolderWatcher
+
+
+@pytest.mark.parametrize('input_folder', ['in', os.path.join('.', 'in')])
+def test_failed_images_are_retried(tmp_path, monkeypatch, input_folder):
+    monkeypatch.chdir(tmp_path)
+    photos = tmp_path / 'in' / 'alice'
+    photos.mkdir(parents=True)
+    Image.new('RGB', (320, 240), 'red').save(photos / 'good.jpg')
+    (photos / 'bad.jpg').write_bytes(b'\xff\xd8not a jpeg')
+
+    batch = BatchProcessor('TEST', jobs=1, modes=('normal',))
+    watcher = FolderWatcher(batch, input_folder, 'out', settle_seconds=1, incremental=False)
+
+    assert watcher.run_once(now=0) is None
+    summary = watcher.run_once(now=2)
+    assert summary['total'] == 2
+    assert [failure['key'] for failure in summary['failed']] == ['alice/bad.jpg']
+    assert watcher.pending_count() == 1
+
+    # Not before the retry delay, then only the failed image
+    assert watcher.run_once(now=2 + RETRY_SECONDS - 0.5) is None
+    summary = watcher.run_once(now=2 + RETRY_SECONDS)
+    assert summary['total'] == 1
+    assert len(summary['failed']) == 1
+
+    # A fixed upload is picked up once it settles
+    Image.new('RGB', (320, 240), 'blue').save(photos / 'bad.jpg')
+    os.utime(photos / 'bad.jpg', ns=(10 ** 18, 10 ** 18))
+    watcher.run_once(now=20)
+    summary = watcher.run_once(now=21.5)
+    assert summary['total'] == 1
+    assert summary['failed'] == []
+    assert (tmp_path / 'out' / 'output_normal' / 'alice' / 'bad.jpg').exists()
+    assert watcher.pending_count() == 0
+
+
+def test_watcher_keeps_one_worker_pool(tmp_path):
+    photos = tmp_path / 'in' / 'alice'
+    photos.mkdir(parents=True)
+    workers = set()
+
+    batch = BatchProcessor('TEST', jobs=2, modes=('normal',))
+    watcher = FolderWatcher(batch, tmp_path / 'in', tmp_path / 'out', settle_seconds=0, incremental=False,
+                            progress_callback=lambda record, done, total: workers.add(record['worker']))
+    batch.start_workers()
+    try:
+        pool = batch._pool
+        # A new pool per batch would use a fresh worker for each of these
+        for tick, color in enumerate(('red', 'green', 'blue')):
+            Image.new('RGB', (320, 240), color).save(photos / f'{color}.jpg')
+            os.utime(photos, ns=(tick, tick))
+            assert watcher.run_once(now=tick * 1000)['total'] == 1
+        assert batch._pool is pool
+        assert len(workers) <= 2
+    finally:
+        batch.close_workers()
+    assert batch._pool is None
@@ -0,0 +1,128 @@
+import io
+import math
+import os
+import random
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+import watermark_processor
+from watermark_processor import WatermarkProcessor
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'logo.png')
+LONG_CAPTION = ("A long caption about the morning light across the valley that should wrap over "
+                "more than one line when rendered on narrow images, and keeps going for a while")
+WORDS = ('a', 'of', 'the', 'light', 'valley', 'morning', 'Kathmandu', 'photograph', 'École',
+         'x' * 30, '2025', '—', 'über-long-hyphenated-compound')
+
+
+@pytest.fixture(scope='module')
+def processor():
+    processor = WatermarkProcessor()
+    processor.load_logo(LOGO_PATH)
+    return processor
+
+
+def _photo(size, mode):
+    """Deterministic noisy test image"""
+    image = Image.effect_noise(size, 64).convert(mode)
+    image.paste((40, 120, 200), (0, 0, size[0] // 2, size[1] // 3))
+    return image
+
+
+@pytest.mark.parametrize('size', [(1920, 1080), (1080, 1920), (640, 480), (160, 120), (60, 40)])
+@pytest.mark.parametrize('mode', ['RGB', 'RGBA'])
+@pytest.mark.parametrize('attribution', [
+    {'team_name': 'Team Alpha', 'caption': LONG_CAPTION, 'photographer': 'Alice'},
+    {'team_name': 'Team Beta', 'caption': '', 'photographer': ''},
+    {}
+])
+def test_normal_regions_match_full_frame(processor, monkeypatch, size, mode, attribution):
+    image = _photo(size, mode)
+    regions = processor._render_overlay(image, 'PNJWEW2025', attribution, None, 'normal')
+
+    monkeypatch.setattr(processor, '_overlay_regions',
+                        lambda img_size, text_boxes, logo_box: [(0, 0, img_size[0], img_size[1])])
+    full_frame = processor._render_overlay(image, 'PNJWEW2025', attribution, None, 'normal')
+
+    assert regions.mode == full_frame.mode
+    assert regions.tobytes() == full_frame.tobytes()
+
+
+def _wrap_by_prefix(text, max_width, font, draw):
+    """The original wrapping: measure every growing prefix with textbbox"""
+    lines = []
+    current_line = []
+    for word in text.split():
+        test_bbox = draw.textbbox((0, 0), ' '.join(current_line + [word]), font=font)
+        if test_bbox[2] - test_bbox[0] <= max_width:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+
+def test_wrap_matches_prefix_measurement(processor):
+    rng = random.Random(2025)
+    draw = processor._get_measure_draw()
+    for _ in range(300):
+        font = processor.get_font(rng.choice((10, 12, 17, 24, 40)))
+        caption = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 40)))
+        max_width = rng.randint(40, 900)
+        assert processor._wrap_text(caption, max_width, font, draw) == \
+            _wrap_by_prefix(caption, max_width, font, draw), (caption, max_width, font.size)
+
+
+def _encoded_photo(size, format):
+    """Deterministic photo-like image with fine detail and sharp lines, encoded as format"""
+    small = (size[0] // 8, size[1] // 8)
+    detail = Image.effect_mandelbrot(small, (-2.2, -1.2, 1.0, 1.2), 100)
+    image = Image.merge('RGB', (detail, Image.linear_gradient('L').resize(small),
+                                Image.radial_gradient('L').resize(small)))
+    image = image.resize(size, Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(image)
+    for x in range(0, size[0], size[0] // 12):
+        draw.line((x, 0, x + size[1] // 2, size[1]), fill=(250, 240, 30), width=4)
+    buffer = io.BytesIO()
+    image.save(buffer, format, quality=92)
+    return buffer.getvalue()
+
+
+def _psnr(a, b):
+    squared = sum(ImageStat.Stat(ImageChops.difference(a, b)).sum2)
+    mse = squared / (a.width * a.height * len(a.getbands()))
+    return 10 * math.log10(255 ** 2 / mse) if mse else math.inf
+
+
+@pytest.mark.parametrize('size, format, decode_info', [
+    ((4000, 2250), 'JPEG', {'method': 'jpeg_draft', 'scale': 2}),
+    ((3000, 1800), 'PNG', {'method': 'none', 'scale': 1})
+])
+def test_decode_downscale_keeps_quality(processor, monkeypatch, size, format, decode_info):
+    monkeypatch.setattr(watermark_processor, 'MAX_OUTPUT_SIZE', (960, 540))
+    source = _encoded_photo(size, format)
+
+    image, original_size, info = processor._load_base_image('photo.' + format.lower(), source)
+
+    with Image.open(io.BytesIO(source)) as full:
+        reference = full.convert('RGB').resize(image.size, Image.Resampling.LANCZOS)
+    assert original_size == size
+    assert info == decode_info
+    # Decoding straight to the output size gives ~37 dB here
+    assert _psnr(image, reference) >= 44
+
+
+def test_decode_16_bit_grayscale(processor, monkeypatch):
+    monkeypatch.setattr(watermark_processor, 'MAX_OUTPUT_SIZE', (480, 270))
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize((2500, 1500)).convert('I').convert('I;16').save(buffer, 'PNG')
+
+    image, original_size, _ = processor._load_base_image('depth.png', buffer.getvalue())
+
+    assert original_size == (2500, 1500)
+    assert image.size == (450, 270)
+    assert image.mode == 'RGB'
@@ -0,0 +1,99 @@
+import asyncio
+import http.client
+import io
+import os
+import signal
+
+from PIL import Image
+
+from watermark_service import WatermarkService
+
+
+def _encode(image, format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+def _post(port, query, body):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('POST', '/watermark?' + query, body=body)
+        response = connection.getresponse()
+        return response.status, response.getheader('Content-Type'), response.read()
+    finally:
+        connection.close()
+
+
+def _upload_all(uploads):
+    """Start a one-worker service on a free localhost port and POST each (query, body)"""
+
+    async def run():
+        service = WatermarkService({}, 'TEST', workers=1)
+        port = await service.start(port=0)
+        try:
+            loop = asyncio.get_running_loop()
+            return [await loop.run_in_executor(None, _post, port, query, body)
+                    for query, body in uploads]
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+def test_uploads_keep_their_format():
+    transparent = Image.new('RGBA', (320, 240), (0, 0, 0, 0))
+    transparent.paste((200, 30, 30, 255), (40, 40, 160, 120))
+    frames = [Image.new('RGB', (320, 240), color) for color in ('red', 'green', 'blue')]
+    animation = _encode(frames[0], 'GIF', save_all=True, append_images=frames[1:], duration=80, loop=0)
+    photo = _encode(Image.new('RGB', (320, 240), 'gray'), 'JPEG')
+
+    png, gif, jpeg, webp = _upload_all([
+        ('filename=alice/logo.png', _encode(transparent, 'PNG')),
+        ('filename=alice/clip.gif&mode=watermarked', animation),
+        ('filename=alice/photo.jpg', photo),
+        ('filename=alice/photo.jpg&format=webp', photo)
+    ])
+
+    assert png[:2] == (200, 'image/png')
+    with Image.open(io.BytesIO(png[2])) as image:
+        assert image.format == 'PNG'
+        assert image.convert('RGBA').getpixel((5, 5))[3] == 0
+
+    assert gif[:2] == (200, 'image/gif')
+    with Image.open(io.BytesIO(gif[2])) as image:
+        assert image.format == 'GIF'
+        assert image.n_frames == 3
+
+    assert jpeg[:2] == (200, 'image/jpeg')
+    assert webp[:2] == (200, 'image/webp')
+
+
+def test_crashed_worker_pool_is_replaced():
+    photo = _encode(Image.new('RGB', (320, 240), 'gray'), 'JPEG')
+
+    async def run():
+        service = WatermarkService({}, 'TEST', workers=1)
+        port = await service.start(port=0)
+        try:
+            loop = asyncio.get_running_loop()
+            broken = service._executor
+            shutdowns = []
+            shutdown = broken.shutdown
+            broken.shutdown = lambda **kwargs: (shutdowns.append(kwargs), shutdown(**kwargs))
+            workers = list(broken._processes.values())
+            for process in workers:
+                os.kill(process.pid, signal.SIGKILL)
+            for process in workers:
+                await loop.run_in_executor(None, process.join, 10)
+
+            crashed = await loop.run_in_executor(None, _post, port, 'filename=a.jpg', photo)
+            assert service._executor is not broken
+            # The broken pool is shut down rather than left holding its resources
+            assert shutdowns == [{'wait': False, 'cancel_futures': True}]
+            recovered = await loop.run_in_executor(None, _post, port, 'filename=a.jpg', photo)
+            return crashed[0], recovered[0]
+        finally:
+            await service.close()
+
+    assert asyncio.run(run()) == (500, 200)
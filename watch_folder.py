@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_POLL_INTERVAL = 1.0
+# A file must keep the same size and mtime this long before it is processed
+DEFAULT_SETTLE_SECONDS = 2.0
+# Full rescans catch files rewritten in place, which leave their folder's mtime alone
+DEFAULT_FULL_SCAN_INTERVAL = 600.0
+# An image that failed to render is tried again after this long, doubling per failure
+RETRY_SECONDS = 5.0
+
+
+class FolderWatcher:
+    """Watch an input folder and watermark new or changed images as they arrive.
+
+    Images are rendered by a BatchProcessor that lives as long as the watcher,
+    so the logo, fonts, caches and attribution data stay loaded between
+    batches. Each tick only stats the folders of the tree; a folder is listed
+    again only when its mtime changes, i.e. when files are added, removed or
+    renamed in it. The whole tree is rescanned on start and then every
+    full_scan_interval seconds. A new or changed file is processed once its
+    size and mtime have stayed the same for settle_seconds, so files still
+    being copied in are left alone until they are complete. An image that
+    fails to render is tried again after RETRY_SECONDS, waiting twice as long
+    after each further failure (at most full_scan_interval), or as soon as it
+    settles again if it is replaced.
+
+    stop() (safe to call from a signal handler or another thread) ends run()
+    after the images already being rendered are finished and their logs
+    written; images not yet started are picked up by the next run.
+    """
+
+    def __init__(self, batch, input_folder, output_folder, poll_interval=DEFAULT_POLL_INTERVAL,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, full_scan_interval=DEFAULT_FULL_SCAN_INTERVAL,
+                 incremental=True, progress_callback=None, batch_callback=None):
+        self.batch = batch
+        self.input_folder = os.fspath(input_folder)
+        self.output_folder = os.fspath(output_folder)
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.full_scan_interval = full_scan_interval
+        self.incremental = incremental
+        self.progress_callback = progress_callback
+        self.batch_callback = batch_callback
+
+        self._root_name = os.path.basename(os.path.normpath(self.input_folder))
+        self._stop = threading.Event()
+        self._last_full_scan = None
+        # Folder path -> (mtime_ns, relative_dir, image paths listed in it)
+        self._dirs = {}
+        # Image path -> (size, mtime_ns) when it was last handed over for processing
+        self._processed = {}
+        # Image path -> [record, size, mtime_ns, time the signature was first seen]
+        self._pending = {}
+        # Image path -> failed attempts in a row
+        self._failures = {}
+
+    def stop(self):
+        """Ask run() to return once the images in progress are done"""
+        self._stop.set()
+
+    def run(self):
+        """Process arriving images until stop() is called"""
+        # One worker pool serves every batch, keeping its assets loaded
+        self.batch.start_workers()
+        try:
+            while not self._stop.is_set():
+                self.run_once()
+                self._stop.wait(self.poll_interval)
+        finally:
+            self.batch.close_workers()
+
+    def run_once(self, now=None):
+        """Poll once and render the images that are ready; returns the batch summary, or
+        None when nothing was ready"""
+        now = time.monotonic() if now is None else now
+        ready = self.poll(now)
+        if not ready:
+            return None
+
+        summary = self.batch.run(self._until_stopped(ready), self.output_folder,
+                                 progress_callback=self.progress_callback,
+                                 incremental=self.incremental)
+        self._retry_failed(ready, summary['failed'], now)
+        if self.batch_callback:
+            self.batch_callback(summary)
+        return summary
+
+    def poll(self, now=None):
+        """Look for changes and return the ImageRecords that are ready to process"""
+        now = time.monotonic() if now is None else now
+        if self._last_full_scan is None or now - self._last_full_scan >= self.full_scan_interval:
+            self._full_scan(now)
+            self._last_full_scan = now
+        else:
+            self._scan_changed_dirs(now)
+        return self._collect_settled(now)
+
+    def pending_count(self):
+        """Number of new or changed images waiting to settle"""
+        return len(self._pending)
+
+    def _until_stopped(self, records):
+        """Hand records to the batch until stop() is called; the rest are forgotten"""
+        for record in records:
+            if self._stop.is_set():
+                # Processed on the next start (or full scan) instead
+                self._processed.pop(record.path, None)
+                continue
+            yield record
+
+    def _retry_failed(self, records, failed, now):
+        """Queue the images of a batch that failed to render again, backing off per failure"""
+        # Failures carry the relative key; their paths may be spelled differently
+        failed_keys = {failure['key'] for failure in failed}
+        for record in records:
+            if Path(record.relative_path).as_posix() not in failed_keys:
+                self._failures.pop(record.path, None)
+                continue
+            signature = self._processed.pop(record.path, None)
+            if signature is None:
+                # Not handed over because of stop()
+                continue
+
+            failures = self._failures.get(record.path, 0) + 1
+            self._failures[record.path] = failures
+            delay = min(RETRY_SECONDS * 2 ** (failures - 1), self.full_scan_interval)
+            # Seen settling from a later time, so it is ready once delay has passed
+            self._pending[record.path] = [record, *signature, now + delay - self.settle_seconds]
+
+    def _full_scan(self, now):
+        visited = self._scan_tree(self.input_folder, '', now)
+
+        # Forget folders (and their images) that disappeared
+        for dir_path in self._dirs.keys() - visited:
+            self._forget_images(self._dirs.pop(dir_path)[2])
+
+    def _scan_changed_dirs(self, now):
+        for dir_path, (mtime_ns, relative_dir, images) in list(self._dirs.items()):
+            try:
+                current = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                current = None
+
+            if current is None:
+                del self._dirs[dir_path]
+                self._forget_images(images)
+            elif current != mtime_ns:
+                self._scan_tree(dir_path, relative_dir, now, known_dirs=True)
+
+    def _scan_tree(self, dir_path, relative_dir, now, known_dirs=False):
+        """List a folder and its subfolders (only those not seen before with known_dirs),
+        noting new or changed images; returns the folders listed"""
+        visited = set()
+        pending_dirs = [(dir_path, relative_dir)]
+        while pending_dirs:
+            dir_path, relative_dir = pending_dirs.pop()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+                images, subdirs = self.batch.processor.scan_directory(dir_path, relative_dir,
+                                                                      self._root_name)
+            except OSError as e:
+                print(f"Error scanning {dir_path}: {e}")
+                continue
+
+            visited.add(dir_path)
+            previous = self._dirs.get(dir_path)
+            paths = {record.path for record in images}
+            if previous:
+                self._forget_images(previous[2] - paths)
+            self._dirs[dir_path] = (mtime_ns, relative_dir, paths)
+
+            for record in images:
+                self._note_image(record, now)
+
+            # Known subfolders are checked by their own mtime on later ticks
+            pending_dirs.extend(subdir for subdir in subdirs
+                                if not (known_dirs and subdir[0] in self._dirs))
+        return visited
+
+    def _note_image(self, record, now):
+        try:
+            stat = os.stat(record.path)
+        except OSError:
+            return
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self._processed.get(record.path) == signature:
+            return
+        pending = self._pending.get(record.path)
+        if pending is None or (pending[1], pending[2]) != signature:
+            self._pending[record.path] = [record, stat.st_size, stat.st_mtime_ns, now]
+
+    def _forget_images(self, paths):
+        for path in paths:
+            self._processed.pop(path, None)
+            self._pending.pop(path, None)
+            self._failures.pop(path, None)
+
+    def _collect_settled(self, now):
+        """Move images whose size and mtime stopped changing from pending to ready"""
+        ready = []
+        for path, pending in list(self._pending.items()):
+            record, size, mtime_ns, since = pending
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = [record, stat.st_size, stat.st_mtime_ns, now]
+            elif size > 0 and now - since >= self.settle_seconds:
+                del self._pending[path]
+                self._processed[path] = (size, mtime_ns)
+                ready.append(record)
+
+        ready.sort(key=lambda record: record.relative_path)
+        return ready
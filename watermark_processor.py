@@ -1,16 +1,125 @@
 import os
 import csv
+import io
 import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from PIL import Image, ImageDraw, ImageFont
 
+from animated_frames import (ANIMATED_FORMATS, encode_streams, iter_frames, iter_rendered,
+                             webp_frame_durations)
+from attribution_log import AttributionLogWriter, LOG_FIELDNAMES
+from attribution_store import AttributionStore
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES, get_output_format, get_save_options
+from instrumentation import StageTimer, NULL_STAGE
+from lru_cache import LRUCache
+
+FONT_PATHS = [
+    "arial.ttf",
+    "Arial.ttf", 
+    "/System/Library/Fonts/Arial.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+]
+
+# Outputs are shrunk to fit within this size
+MAX_OUTPUT_SIZE = (1920, 1080)
+
+# JPEG draft decoding keeps at least this factor above the output size
+DECODE_REDUCING_GAP = 2.0
+# Final resize to the output size; larger reductions are first done by an
+# integer box reduction that keeps at least this factor above the output size
+RESIZE_REDUCING_GAP = 3.0
+
+# Rows composited at a time, bounding the temporary RGBA copies of the base image
+COMPOSITE_STRIP_ROWS = 128
+
+# Alpha lookup table for the faint (50% opacity) logo
+_HALF_ALPHA_LUT = [int(p * 0.5) for p in range(256)]
+
+# Sentinel for cache lookups, since a cached font may legitimately be None
+_MISSING = object()
+
+# Diagonal pattern text colour (0.2 opacity = 51/255)
+PATTERN_TEXT_FILL = (255, 255, 255, 51)
+
+class ImageRecord:
+    """An image found while scanning an input folder.
+    
+    'path' is the full file path, 'relative_path' is relative to the scanned folder,
+    and 'photographer'/'subfolder' name the containing folder (None for images at
+    the top level). Fields can also be read dict-style, e.g. record['path'].
+    """
+    __slots__ = ('path', 'photographer', 'subfolder', 'relative_path')
+    
+    def __init__(self, path, photographer, subfolder, relative_path):
+        self.path = path
+        self.photographer = photographer
+        self.subfolder = subfolder
+        self.relative_path = relative_path
+    
+    def __getitem__(self, key):
+        return getattr(self, key)
+    
+    def __repr__(self):
+        return f"ImageRecord({self.relative_path!r}, photographer={self.photographer!r})"
+
 class WatermarkProcessor:
-    def __init__(self):
+    def __init__(self, font_path=None, font_cache_size=32, rgb_native=True,
+                 encoder_profile=DEFAULT_ENCODER_PROFILE, frame_threads=None, overlay_cache_mb=64):
         self.supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.gif')
-        self.attribution_data = {}
+        self.attributions = AttributionStore()
         self.logo_image = None
         
+        # Font file is resolved once per processor; loaded fonts are memoized per size
+        self.font_path = font_path
+        self._resolved_font_path = None
+        self._font_probed = False
+        self._font_cache = LRUCache(font_cache_size)
+        
+        # Attribution logs kept open for the duration of a run, keyed by absolute path
+        self._log_writers = {}
+        
+        # Resized and faint logos per (target size, mode), dropped when the logo changes
+        self._logo_cache = LRUCache(32)
+        
+        # Rasterized diagonal pattern texts, reused across images
+        self._logo_version = 0
+        self._pattern_text_cache = LRUCache(16)
+        
+        # Full-frame pattern layers per (output size, text, logo, mode), capped in memory
+        self._overlay_cache = LRUCache(64, max_bytes=int(overlay_cache_mb * 1024 * 1024))
+        
+        # Optional callable receiving one event dict per timed stage (see instrumentation.py)
+        self.stage_hook = None
+        
+        # Scratch drawing context for measuring text, created on first use
+        self._measure_draw = None
+        
+        # Text measurements and wrapped lines per (text, font, max width), and whole
+        # attribution layouts per (image size, texts); dropped when the font changes
+        self._text_layout_cache = LRUCache(1024)
+        self._attribution_layout_cache = LRUCache(256)
+        
+        # Decoded photos behind the last few GUI previews, per (file, preview size)
+        self._preview_base_cache = LRUCache(4)
+        
+        # Keep opaque images in RGB instead of converting every image to RGBA
+        self.rgb_native = rgb_native
+        
+        # Named set of per-format save options (see encoder_profiles.py)
+        if encoder_profile not in ENCODER_PROFILES:
+            raise ValueError(f"Unknown encoder profile '{encoder_profile}'")
+        self.encoder_profile = encoder_profile
+        
+        # Threads compositing the frames of animated images, started on first use
+        self.frame_threads = frame_threads if frame_threads is not None else min(4, os.cpu_count() or 1)
+        self._frame_executor = None
+        
     def load_logo(self, logo_path):
         """Load and prepare logo image for watermarking"""
         try:
@@ -18,165 +127,344 @@ class WatermarkProcessor:
                 if logo.mode != 'RGBA':
                     logo = logo.convert('RGBA')
                 self.logo_image = logo.copy()
+            self._logo_version += 1
+            self._logo_cache.clear()
+            self._overlay_cache.clear()
             return True
         except Exception as e:
             print(f"Error loading logo: {e}")
             return False
         
-    def load_attribution_csv(self, csv_path):
-        """Load attribution data from CSV file"""
+    def load_attribution_csv(self, csv_path, use_index=None):
+        """Load attribution data from CSV file.
+        
+        use_index=True keeps the rows in an on-disk SQLite index instead of memory;
+        None picks the index for large CSVs (see attribution_store.py).
+        """
         try:
-            with open(csv_path, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    filename = row.get('filename', '').lower()
-                    self.attribution_data[filename] = {
-                        'team_name': row.get('team_name', ''),
-                        'caption': row.get('caption', ''),
-                        'photographer': row.get('photographer', '')
-                    }
-            return len(self.attribution_data)
+            count = self.attributions.load(csv_path, use_index)
+            if self.attributions.duplicates:
+                print(f"Attribution CSV has {len(self.attributions.duplicates)} duplicate key(s), "
+                      f"later rows win: {', '.join(self.attributions.duplicates[:5])}")
+            if self.attributions.ambiguous:
+                print(f"Attribution CSV has {len(self.attributions.ambiguous)} file name(s) used in "
+                      f"several folders: {', '.join(self.attributions.ambiguous[:5])}")
+            return count
         except Exception as e:
             print(f"Error loading CSV: {e}")
             return 0
     
+    def get_attribution(self, image_path, relative_path=None):
+        """Attribution for an image by its path relative to the input folder, falling back to its name"""
+        return self.attributions.lookup(relative_path, Path(image_path).name)
+    
     def find_all_images(self, root_folder):
-        image_files = []
-        root_path = Path(root_folder)
+        """Find all supported images under root_folder and return them as a list"""
+        return list(self.iter_images(root_folder))
+    
+    def iter_images(self, root_folder):
+        """Yield an ImageRecord for each supported image as the folder tree is walked.
         
-        for file_path in root_path.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_formats:
-                photographer_folder = file_path.parent.name
-                if photographer_folder != root_path.name:
-                    photographer_name = photographer_folder
-                    subfolder_name = photographer_folder
-                else:
-                    photographer_name = None
-                    subfolder_name = None
-                    
-                image_files.append({
-                    'path': file_path,
-                    'photographer': photographer_name,
-                    'subfolder': subfolder_name,
-                    'relative_path': file_path.relative_to(root_path)
-                })
-        
-        return image_files
+        Uses os.scandir so file/directory checks come from the directory entries
+        themselves instead of an extra stat call per file.
+        """
+        root = os.fspath(root_folder)
+        root_name = os.path.basename(os.path.normpath(root))
+        pending_dirs = [(root, '')]
+        
+        while pending_dirs:
+            dir_path, relative_dir = pending_dirs.pop()
+            try:
+                images, subdirs = self.scan_directory(dir_path, relative_dir, root_name)
+            except OSError as e:
+                print(f"Error scanning {dir_path}: {e}")
+                continue
             
+            yield from images
+            
+            # Walk subfolders in name order (reversed because the stack pops from the end)
+            pending_dirs.extend(reversed(subdirs))
+    
+    def scan_directory(self, dir_path, relative_dir, root_name):
+        """List one folder of the input tree without descending into it.
+        
+        relative_dir is the folder's path under the input folder ('' for the input
+        folder itself, whose name is root_name). Returns the ImageRecords of the
+        supported images in it (symlinked files included) and its subfolders, not
+        counting symlinks to folders, as (path, relative_dir) pairs sorted by name.
+        Raises OSError if the folder cannot be read.
+        """
+        # Images directly in the input folder have no photographer subfolder
+        dir_name = os.path.basename(dir_path) if relative_dir else root_name
+        photographer_name = dir_name if dir_name != root_name else None
+        
+        images = []
+        subdirs = []
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                try:
+                    # Symlinked folders are not followed, so a link back up the tree
+                    # cannot make the walk loop
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry)
+                        continue
+                    is_image = (entry.is_file() and 
+                                os.path.splitext(entry.name)[1].lower() in self.supported_formats)
+                except OSError:
+                    continue
+                
+                if is_image:
+                    images.append(ImageRecord(entry.path, photographer_name, photographer_name,
+                                              os.path.join(relative_dir, entry.name)))
+        
+        subdirs = [(entry.path, os.path.join(relative_dir, entry.name))
+                   for entry in sorted(subdirs, key=lambda e: e.name)]
+        return images, subdirs
+    
+    def set_font_path(self, font_path):
+        """Use a specific font file and skip probing the system font locations"""
+        self.font_path = font_path
+        self._resolved_font_path = None
+        self._font_probed = False
+        self._font_cache.clear()
+        self._pattern_text_cache.clear()
+        self._overlay_cache.clear()
+        self._text_layout_cache.clear()
+        self._attribution_layout_cache.clear()
+    
+    def _resolve_font_path(self):
+        """Find a usable font file once and remember it for later lookups"""
+        if self._font_probed:
+            return self._resolved_font_path
+        
+        candidates = [self.font_path] if self.font_path else FONT_PATHS
+        for font_path in candidates:
+            try:
+                ImageFont.truetype(font_path, 20)
+                self._resolved_font_path = font_path
+                break
+            except:
+                continue
+        
+        if self.font_path and self._resolved_font_path is None:
+            print(f"Error loading font: {self.font_path}, using default font")
+        
+        self._font_probed = True
+        return self._resolved_font_path
+    
     def get_font(self, size=20):
         """Get appropriate font for text rendering"""
-        font_paths = [
-            "arial.ttf",
-            "Arial.ttf", 
-            "/System/Library/Fonts/Arial.ttf",
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-            "C:\\Windows\\Fonts\\arial.ttf",
-            "/System/Library/Fonts/Helvetica.ttc",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
-        ]
-        
-        for font_path in font_paths:
+        font = self._font_cache.get(size, _MISSING)
+        if font is not _MISSING:
+            return font
+        
+        font = None
+        font_path = self._resolve_font_path()
+        if font_path:
             try:
-                return ImageFont.truetype(font_path, size)
+                font = ImageFont.truetype(font_path, size)
             except:
-                continue
+                font = None
         
-        try:
-            return ImageFont.load_default()
-        except:
-            return None
+        if font is None:
+            try:
+                font = ImageFont.load_default()
+            except:
+                font = None
+        
+        self._font_cache.put(size, font)
+        return font
+    
+    def get_font_cache_stats(self):
+        """Get hit/miss counters of the font cache"""
+        stats = self._font_cache.stats()
+        stats['font_path'] = self._resolve_font_path()
+        return stats
+    
+    def get_overlay_cache_stats(self):
+        """Get hit/miss/eviction counters and memory use of the pattern layer cache"""
+        return self._overlay_cache.stats()
     
     def add_diagonal_pattern(self, overlay, img_size, watermark_text, logo_resized=None):
-        """Add diagonal watermark pattern across the entire image"""
-        draw = ImageDraw.Draw(overlay)
+        """Add diagonal watermark pattern across the entire image.
+        
+        Texts are placed at a fixed step along 45-degree lines, one line per diagonal
+        spacing, with a faint logo at every third position. A text and its logo are
+        drawn only when the text anchor lies within a text size of the image. Where the
+        font allows, the text is rasterized once into a cached mask and pasted at the
+        whole pixel the font renderer snaps each position to; texts crossing the top or
+        left edge are drawn directly. Either way the result is the same as drawing
+        every text separately.
+        """
         img_width, img_height = img_size
         
         # Font size based on image size
         pattern_font_size = max(24, img_width // 40)
-        pattern_font = self.get_font(pattern_font_size)
         
         # Calculate diagonal spacing
         diagonal_spacing = max(200, img_width // 8)
         
+        # Reuse the cached faint logo when given the cached resized logo for this size
+        faint_logo = None
+        if logo_resized:
+            assets = self.get_logo_assets(img_size, 'watermarked')
+            if assets and assets[0] is logo_resized:
+                faint_logo = assets[1]
+            else:
+                faint_logo = self._make_faint_logo(logo_resized)
+        
+        pattern_text = self._get_pattern_text(watermark_text, pattern_font_size)
+        pattern_font = pattern_text['font']
+        text_mask = pattern_text['mask']
+        mask_x, mask_y = pattern_text['offset']
+        text_width, text_height = pattern_text['size']
+        draw = ImageDraw.Draw(overlay)
+        
         # Use 45-degree angle for consistent diagonal pattern
         angle_rad = math.radians(45)
         
-        # Calculate text dimensions for positioning
-        if pattern_font:
-            bbox = draw.textbbox((0, 0), watermark_text, font=pattern_font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-        else:
-            text_width = len(watermark_text) * 12
-            text_height = 20
-        
-        # Calculate the diagonal of the image to ensure full coverage
+        # Cover the image from corner to corner, starting outside its bounds
         image_diagonal = math.sqrt(img_width**2 + img_height**2)
-        
-        # Calculate how many diagonal lines we need to cover the entire image
-        # We need to cover from one corner to the opposite corner
         num_diagonals = int(image_diagonal / diagonal_spacing) + 2
-        
-        # Starting position - we'll start from outside the image bounds to ensure coverage
         start_offset = image_diagonal / 2
         
-        # Create diagonal lines going from top-left to bottom-right direction
         for i in range(-num_diagonals, num_diagonals + 1):
-            # Calculate the starting point for this diagonal line
             # Each line is offset by diagonal_spacing perpendicular to the diagonal direction
             offset_distance = i * diagonal_spacing
-            
-            # Calculate perpendicular offset (rotate 90 degrees from diagonal direction)
             perp_x = -math.sin(angle_rad) * offset_distance
             perp_y = math.cos(angle_rad) * offset_distance
             
-            # Start from center and add perpendicular offset
             start_x = img_width / 2 + perp_x - start_offset * math.cos(angle_rad)
             start_y = img_height / 2 + perp_y - start_offset * math.sin(angle_rad)
             
-            # Calculate how many text elements we need along this diagonal
             diagonal_length = image_diagonal * 2  # Extra length to ensure coverage
             num_texts_on_line = int(diagonal_length / (text_width + 50)) + 1
             
-            # Place text elements along this diagonal line
             for j in range(num_texts_on_line):
-                # Calculate position along the diagonal
                 distance_along_diagonal = j * (text_width + 50)
-                
                 x = start_x + distance_along_diagonal * math.cos(angle_rad)
                 y = start_y + distance_along_diagonal * math.sin(angle_rad)
                 
                 # Only draw if any part of the text would be visible in the image
-                if (x > -text_width and x < img_width + text_width and 
-                    y > -text_height and y < img_height + text_height):
-                    
-                    # Add semi-transparent text (0.2 opacity = 51/255)
-                    if pattern_font:
-                        draw.text((x, y), watermark_text, fill=(255, 255, 255, 51), font=pattern_font)
-                    
-                    # Add small logo at some positions (every 3rd position)
-                    if logo_resized and (i + j) % 3 == 0:
-                        logo_x = int(x + text_width + 20)
-                        logo_y = int(y - logo_resized.height // 2)
-                        
-                        # Create a faint version of the logo (0.5 opacity)
-                        faint_logo = logo_resized.copy()
-                        # Reduce alpha channel to make it faint
-                        if faint_logo.mode == 'RGBA':
-                            alpha = faint_logo.split()[-1]
-                            alpha = alpha.point(lambda p: int(p * 0.5))  # 50% opacity
-                            faint_logo.putalpha(alpha)
-                        
-                        # Check if logo position is at least partially within image bounds
-                        if (logo_x > -logo_resized.width and logo_x < img_width + logo_resized.width and 
-                        logo_y > -logo_resized.height and logo_y < img_height + logo_resized.height):
-                            overlay.paste(faint_logo, (logo_x, logo_y), faint_logo)
-
+                if not (x > -text_width and x < img_width + text_width and 
+                        y > -text_height and y < img_height + text_height):
+                    continue
+                
+                # Add semi-transparent text (0.2 opacity = 51/255)
+                if text_mask and x >= 0 and y >= 0:
+                    overlay.paste(PATTERN_TEXT_FILL, (self._snap_glyph_x(x) + mask_x, 
+                                                      self._snap_glyph_y(y) + mask_y), text_mask)
+                elif pattern_font:
+                    draw.text((x, y), watermark_text, fill=PATTERN_TEXT_FILL, font=pattern_font)
+                
+                # Add small logo at some positions (every 3rd position)
+                if faint_logo and (i + j) % 3 == 0:
+                    logo_x = int(x + text_width + 20)
+                    logo_y = int(y - faint_logo.height // 2)
+                    overlay.paste(faint_logo, (logo_x, logo_y), faint_logo)
+    
+    def _get_pattern_text(self, watermark_text, font_size):
+        """Get the cached pattern text for a font size, rendering it on a miss.
+        
+        Returns a dict with the 'font' (None when no font could be loaded), the text
+        'size' used for spacing, and a 'mask' of the text as drawn at (0, 0) to paste
+        at a snapped position plus its 'offset'. The mask is None when the font's
+        glyphs do not just shift by whole pixels with the sub-pixel position (e.g.
+        unhinted fonts), in which case every text is drawn directly.
+        """
+        key = (watermark_text, font_size)
+        text = self._pattern_text_cache.get(key)
+        if text is None:
+            pattern_font = self.get_font(font_size)
+            text = {'font': pattern_font, 'mask': None, 'offset': (0, 0),
+                    'size': (len(watermark_text) * 12, 20)}
+            if pattern_font:
+                bbox = pattern_font.getbbox(watermark_text)
+                left = min(0, bbox[0])
+                top = min(0, bbox[1])
+                mask_size = (bbox[2] - left + 1, bbox[3] - top + 1)
+                text['size'] = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+                text['offset'] = (left, top)
+                
+                mask = self._draw_pattern_mask(pattern_font, watermark_text, mask_size, (-left, -top))
+                if self._mask_snaps(pattern_font, watermark_text, mask, (left, top)):
+                    text['mask'] = mask
+            self._pattern_text_cache.put(key, text)
+        return text
+    
+    @staticmethod
+    def _draw_pattern_mask(font, watermark_text, size, position):
+        mask = Image.new('L', size, 0)
+        ImageDraw.Draw(mask).text(position, watermark_text, fill=255, font=font)
+        return mask
+    
+    def _mask_snaps(self, font, watermark_text, mask, offset):
+        """Check that drawing at sub-pixel positions matches pasting the mask at the snapped pixel.
+        
+        Hinted glyphs move in whole pixels, each at some 1/64 step of the position,
+        so it is enough to check just before and at the step where the text should
+        move, and both ends; a glyph moving at any other step fails one of these.
+        """
+        canvas_size = (mask.width + 4, mask.height + 4)
+        positions = [(2 + step / 64, 2) for step in (1, 31, 32, 63)]
+        positions += [(2, 2 + step / 64) for step in (1, 32, 33, 63)]
+        for x, y in positions:
+            drawn = self._draw_pattern_mask(font, watermark_text, canvas_size, 
+                                            (x - offset[0], y - offset[1]))
+            pasted = Image.new('L', canvas_size, 0)
+            pasted.paste(mask, (self._snap_glyph_x(x), self._snap_glyph_y(y)))
+            if drawn.tobytes() != pasted.tobytes():
+                return False
+        return True
+    
+    @staticmethod
+    def _snap_glyph_x(x):
+        """Whole pixel FreeType puts hinted text drawn at a non-negative x on.
+        
+        The fraction is rounded to 1/64 pixel (FreeType's 26.6 units) and x rounds
+        half up; y below rounds half down, since FreeType's y axis points up.
+        """
+        whole = int(x)
+        return whole + (math.floor((x - whole) * 64 + 0.5) >= 32)
+    
+    @staticmethod
+    def _snap_glyph_y(y):
+        whole = int(y)
+        return whole + (math.floor((y - whole) * 64 + 0.5) >= 33)
+    
     def resize_logo(self, target_size, mode='normal'):
         """Resize logo based on target image size and watermark mode"""
+        assets = self.get_logo_assets(target_size, mode)
+        return assets[0] if assets else None
+    
+    def get_faint_logo(self, target_size, mode='watermarked'):
+        """Get the 50% opacity version of the resized logo"""
+        assets = self.get_logo_assets(target_size, mode)
+        return assets[1] if assets else None
+    
+    def get_logo_assets(self, target_size, mode='normal'):
+        """Get the cached (resized logo, faint logo) pair for a target size and mode"""
         if not self.logo_image:
             return None
-            
+        
+        key = (tuple(target_size), mode)
+        assets = self._logo_cache.get(key)
+        if assets is None:
+            resized = self._resize_logo(target_size, mode)
+            assets = (resized, self._make_faint_logo(resized))
+            self._logo_cache.put(key, assets)
+        return assets
+    
+    def _make_faint_logo(self, logo):
+        """Return a copy of the logo at half its opacity"""
+        faint_logo = logo.copy()
+        if faint_logo.mode == 'RGBA':
+            alpha = faint_logo.getchannel('A').point(_HALF_ALPHA_LUT)
+            faint_logo.putalpha(alpha)
+        return faint_logo
+    
+    def _resize_logo(self, target_size, mode):
+        """Resize the original logo for a target image size (uncached)"""
         img_width, img_height = target_size
         
         if mode == 'watermarked':
@@ -198,155 +486,660 @@ class WatermarkProcessor:
         return self.logo_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
     
     def add_watermark(self, image_path, output_path, watermark_text, attribution_log_path, 
-                     photographer_name=None, subfolder_name=None, watermark_mode='normal'):
+                     photographer_name=None, subfolder_name=None, watermark_mode='normal',
+                     relative_path=None):
         """Add watermark to image with two modes: normal and watermarked"""
+        variants = [{
+            'mode': watermark_mode,
+            'output_path': output_path,
+            'log_path': attribution_log_path
+        }]
+        results = self.render_variants(image_path, variants, watermark_text,
+                                       photographer_name, subfolder_name, relative_path=relative_path)
+        return results[0]['success']
+    
+    def _stage(self, stage, image_path):
+        """Context manager timing one processing stage; a shared no-op when no hook is set"""
+        if self.stage_hook is None:
+            return NULL_STAGE
+        return StageTimer(self.stage_hook, str(image_path), stage)
+    
+    def render_variants(self, image_path, variants, watermark_text, 
+                        photographer_name=None, subfolder_name=None, source=None, encode_only=False,
+                        relative_path=None, attribution=None):
+        """Decode and resize an image once, then render and save each requested variant.
+        
+        Each variant is a dict with 'mode', 'output_path' and 'log_path' keys. Returns a
+        list of result dicts (in the same order) with 'mode', 'output_path', 'success' and
+        'decode' (the downscale applied while decoding), 'encode_time' and 'output_size'
+        (seconds spent saving and bytes written), plus 'error' on failure. Variants
+        without a 'log_path' get their attribution row back as 'log_row' instead of having
+        it appended to a log file.
+        
+        relative_path (the image's path under the input folder) selects path-specific
+        attribution rows; an attribution dict ('team_name', 'caption', 'photographer')
+        replaces the CSV lookup altogether. source optionally holds the already-read file contents of
+        image_path. With encode_only the encoded output is returned as result['data']
+        instead of being written to output_path, leaving the write to the caller.
+        """
+        results = [{'mode': variant['mode'], 'output_path': variant['output_path'], 'success': False}
+                   for variant in variants]
+        
+        # Get attribution data
+        if attribution is None:
+            attribution = self.get_attribution(image_path, relative_path)
+        
+        if self._is_animation(image_path, source, variants):
+            return self._render_animated_variants(image_path, variants, results, watermark_text,
+                                                  attribution, photographer_name, subfolder_name,
+                                                  source, encode_only)
+        
         try:
-            with Image.open(image_path) as img:
-                max_size = (1920, 1080)
-                original_size = img.size
-                
-                # Resize if image is too large
-                if img.width > max_size[0] or img.height > max_size[1]:
-                    ratio = min(max_size[0] / img.width, max_size[1] / img.height)
-                    new_size = (int(img.width * ratio), int(img.height * ratio))
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
-                
-                if img.mode != 'RGBA':
-                    img = img.convert('RGBA')
-                
-                overlay = Image.new('RGBA', img.size, (255, 255, 255, 0))
-                draw = ImageDraw.Draw(overlay)
-                
-                # Fonts for different elements
-                watermark_font = self.get_font(max(16, img.width // 60))
-                caption_font = self.get_font(max(12, img.width // 80))
-                photographer_font = self.get_font(max(10, img.width // 90))
-                
-                margin = max(15, img.width // 80)
-                
-                # Resize logo based on mode
-                logo_resized = self.resize_logo(img.size, watermark_mode)
-                
-                # Add diagonal pattern for watermarked mode
-                if watermark_mode == 'watermarked':
-                    self.add_diagonal_pattern(overlay, img.size, watermark_text, logo_resized)
-                
-                # Get attribution data
-                filename_key = Path(image_path).name.lower()
-                attribution = self.attribution_data.get(filename_key, {})
-                
-                # Position elements from bottom up
-                current_y = img.height - margin
+            img, original_size, decode_info = self._load_base_image(image_path, source)
+        except Exception as e:
+            for result in results:
+                result['error'] = str(e)
+            print(f"Error processing {image_path}: {e}")
+            return results
+        
+        for result in results:
+            result['decode'] = decode_info
+        
+        for index, (variant, result) in enumerate(zip(variants, results)):
+            output_path = str(variant['output_path'])
+            try:
+                # The last variant may draw straight onto the decoded image
+                watermarked = self._render_overlay(img, watermark_text, attribution, 
+                                                   photographer_name, variant['mode'], image_path,
+                                                   in_place=index == len(variants) - 1)
                 
-                # Add photographer info if available
-                photographer_text = photographer_name or attribution.get('photographer', '')
-                if photographer_text:
-                    if photographer_font:
-                        bbox = draw.textbbox((0, 0), f"Photo: {photographer_text}", font=photographer_font)
-                        text_height = bbox[3] - bbox[1]
-                    else:
-                        text_height = 12
+                with self._stage('encode', image_path) as stage:
+                    # Convert back to RGB if needed for JPEG; other formats are saved
+                    # as RGBA, as they would be from an RGBA pipeline
+                    if output_path.lower().endswith(('.jpg', '.jpeg')):
+                        if watermarked.mode != 'RGB':
+                            watermarked = watermarked.convert('RGB')
+                    elif watermarked.mode != 'RGBA':
+                        watermarked = watermarked.convert('RGBA')
                     
-                    current_y -= text_height
-                    draw.text((margin, current_y), f"Photo: {photographer_text}", 
-                             fill=(255, 255, 255, 200), font=photographer_font)
-                    current_y -= 5  # Small gap
+                    # Save the watermarked image
+                    self._save_output(watermarked, output_path, result, encode_only)
+                    stage.bytes = result['output_size']
                 
-                # Add caption if available
-                caption_text = attribution.get('caption', '')
-                if caption_text:
-                    # Word wrap caption if too long
-                    max_caption_width = img.width - 2 * margin
-                    if caption_font:
-                        bbox = draw.textbbox((0, 0), caption_text, font=caption_font)
-                        text_width = bbox[2] - bbox[0]
-                        text_height = bbox[3] - bbox[1]
-                    else:
-                        text_width = len(caption_text) * 8
-                        text_height = 14
-                    
-                    if text_width > max_caption_width:
-                        # Simple word wrapping
-                        lines = self._wrap_text(caption_text, max_caption_width, caption_font, draw)
-                        
-                        # Draw wrapped caption
-                        for i, line in enumerate(reversed(lines)):
-                            current_y -= text_height
-                            draw.text((margin, current_y), line, 
-                                     fill=(255, 255, 255, 220), font=caption_font)
-                            if i < len(lines) - 1:
-                                current_y -= 2  # Line spacing
-                    else:
-                        current_y -= text_height
-                        draw.text((margin, current_y), caption_text, 
-                                 fill=(255, 255, 255, 220), font=caption_font)
-                    
-                    current_y -= 8  # Gap before main watermark
-                
-                # Add main watermark text
-                team_name = attribution.get('team_name', watermark_text)
-                main_watermark = team_name or watermark_text
-                
-                if watermark_font:
-                    bbox = draw.textbbox((0, 0), main_watermark, font=watermark_font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                else:
-                    text_width = len(main_watermark) * 12
-                    text_height = 18
+                self._log_variant(image_path, variant, result, attribution, photographer_name,
+                                  subfolder_name, original_size, watermarked.size)
+                result['success'] = True
                 
-                current_y -= text_height
-                draw.text((margin, current_y), main_watermark, 
-                         fill=(255, 255, 255, 255), font=watermark_font)
-                
-                # Add logo
-                if logo_resized:
-                    logo_x = img.width - logo_resized.width - margin
-                    logo_y = img.height - logo_resized.height - margin
-                    overlay.paste(logo_resized, (logo_x, logo_y), logo_resized)
-                
-                # Combine original image with overlay
-                watermarked = Image.alpha_composite(img, overlay)
+            except Exception as e:
+                result['error'] = str(e)
+                print(f"Error processing {image_path}: {e}")
+        
+        return results
+    
+    def _save_output(self, image, output_path, result, encode_only, **options):
+        """Save one output under the encoder profile, or keep its bytes in result['data'] with encode_only"""
+        encode_start = time.perf_counter()
+        save_options = get_save_options(self.encoder_profile, output_path)
+        save_options.update(options)
+        if encode_only:
+            buffer = io.BytesIO()
+            image.save(buffer, format=get_output_format(output_path), **save_options)
+            result['data'] = buffer.getvalue()
+            result['output_size'] = len(result['data'])
+        else:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            image.save(output_path, **save_options)
+            result['output_size'] = os.path.getsize(output_path)
+        result['encode_time'] = time.perf_counter() - encode_start
+    
+    def _log_variant(self, image_path, variant, result, attribution, photographer_name,
+                     subfolder_name, original_size, output_size):
+        """Log the processing, or hand the row back to the caller when it collects
+        rows itself (e.g. a batch runner with a single log writer)"""
+        with self._stage('log', image_path):
+            log_row = self.build_log_row(image_path, str(variant['output_path']), attribution, 
+                                         photographer_name, subfolder_name, 
+                                         original_size, output_size)
+            if variant.get('log_path'):
+                self.append_log_rows(str(variant['log_path']), [log_row])
+            else:
+                result['log_row'] = log_row
+    
+    def _is_animation(self, image_path, source, variants):
+        """True for a multi-frame GIF or WebP whose outputs are all animated formats too"""
+        if os.path.splitext(str(image_path))[1].lower() not in ('.gif', '.webp'):
+            return False
+        if not all(get_output_format(variant['output_path']) in ANIMATED_FORMATS for variant in variants):
+            return False
+        try:
+            with Image.open(io.BytesIO(source) if source is not None else image_path) as img:
+                return getattr(img, 'is_animated', False)
+        except Exception:
+            # Let the still image path report the error
+            return False
+    
+    def _render_animated_variants(self, image_path, variants, results, watermark_text, attribution,
+                                  photographer_name, subfolder_name, source, encode_only):
+        """Render all variants of an animated GIF or WebP from a single pass over its frames.
+        
+        The overlays are built once per variant at the output frame size. Each
+        frame is decoded and resized once, every variant's overlays are
+        composited onto their own copy of it, and the copies are streamed into
+        one encoder per variant through save_all with an append_images
+        generator, so only a few frames are in memory at a time (Pillow's WebP
+        writer still collects the appended frames before encoding). Per-frame
+        durations, the loop count and the background are carried over; results
+        also get 'frames', the number of frames written.
+        """
+        for result in results:
+            result['decode'] = {'method': 'none', 'scale': 1}
+        
+        try:
+            with Image.open(io.BytesIO(source) if source is not None else image_path) as img:
+                original_size = img.size
+                new_size = self._bounded_size(img.size)
+                frame_size = new_size or img.size
                 
-                # Convert back to RGB if needed for JPEG
-                if output_path.lower().endswith(('.jpg', '.jpeg')):
-                    watermarked = watermarked.convert('RGB')
+                rendering = []
+                for variant, result in zip(variants, results):
+                    try:
+                        overlays = self._build_overlays(frame_size, watermark_text, attribution,
+                                                        photographer_name, variant['mode'], image_path)
+                    except Exception as e:
+                        result['error'] = str(e)
+                        print(f"Error processing {image_path}: {e}")
+                        continue
+                    rendering.append((variant, result, overlays))
                 
-                # Save the watermarked image
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                watermarked.save(output_path, quality=95, optimize=True)
+                durations = None
+                if img.format == 'WEBP':
+                    # The WebP writer takes all durations up front
+                    durations = self._read_webp_durations(image_path, source)
+                    if len(durations) != img.n_frames:
+                        durations = None
                 
-                # Log the processing
-                self.log_attribution(attribution_log_path, image_path, output_path, 
-                                   attribution, photographer_name, subfolder_name, 
-                                   original_size, watermarked.size)
+                encoders = [self._animation_encoder(img, str(variant['output_path']), result,
+                                                    encode_only, durations, image_path)
+                            for variant, result, _ in rendering]
                 
-                return True
+                def render_frame(frame):
+                    return self._render_animation_frame(frame, new_size,
+                                                        [overlays for _, _, overlays in rendering],
+                                                        image_path)
                 
+                frame_sets = iter_rendered(iter_frames(img), render_frame, self._get_frame_executor())
+                errors = encode_streams(frame_sets, encoders) if encoders else []
+                n_frames = img.n_frames
         except Exception as e:
+            for result in results:
+                result.setdefault('error', str(e))
             print(f"Error processing {image_path}: {e}")
-            return False
+            return results
+        
+        for (variant, result, _), error in zip(rendering, errors):
+            try:
+                if error is not None:
+                    raise error
+                result['frames'] = n_frames
+                self._log_variant(image_path, variant, result, attribution, photographer_name,
+                                  subfolder_name, original_size, frame_size)
+                result['success'] = True
+                
+            except Exception as e:
+                result['error'] = str(e)
+                print(f"Error processing {image_path}: {e}")
+        
+        return results
+    
+    def _animation_encoder(self, img, output_path, result, encode_only, durations, image_path=None):
+        """Encoder for encode_streams that saves one variant of an animation to output_path"""
+        options = {'save_all': True}
+        if 'loop' in img.info:
+            options['loop'] = img.info['loop']
+        if durations and get_output_format(output_path) == 'WEBP':
+            options['duration'] = durations
+        
+        def encode(first, rest):
+            with self._stage('encode', image_path) as stage:
+                self._save_output(first, output_path, result, encode_only, append_images=rest, **options)
+                stage.bytes = result['output_size']
+        
+        return encode
+    
+    def _render_animation_frame(self, frame, new_size, variant_overlays, image_path=None):
+        """Bring one decoded animation frame to RGBA at the output size and composite each
+        variant's overlays onto a copy of it; returns one frame per variant"""
+        info = frame.info
+        if frame.mode != 'RGBA':
+            frame = frame.convert('RGBA')
+        if new_size:
+            with self._stage('resize', image_path) as stage:
+                frame = frame.resize(new_size, Image.Resampling.LANCZOS)
+                stage.bytes = frame.width * frame.height * 4
+        
+        rendered = []
+        for index, overlays in enumerate(variant_overlays):
+            # The last variant draws onto the resized frame itself
+            output = frame if index == len(variant_overlays) - 1 else frame.copy()
+            self._apply_overlays(output, overlays, image_path)
+            output.info = info
+            rendered.append(output)
+        return tuple(rendered)
+    
+    def _read_webp_durations(self, image_path, source):
+        if source is not None:
+            return webp_frame_durations(io.BytesIO(source))
+        with open(image_path, 'rb') as file:
+            return webp_frame_durations(file)
+    
+    def _get_frame_executor(self):
+        """Thread pool rendering animation frames, or None to render them inline"""
+        if self.frame_threads <= 1:
+            return None
+        if self._frame_executor is None:
+            self._frame_executor = ThreadPoolExecutor(self.frame_threads, thread_name_prefix='wm-frame')
+        return self._frame_executor
+    
+    @staticmethod
+    def _bounded_size(size):
+        """The size an image is shrunk to so it fits MAX_OUTPUT_SIZE, or None if it already fits"""
+        max_size = MAX_OUTPUT_SIZE
+        if size[0] > max_size[0] or size[1] > max_size[1]:
+            ratio = min(max_size[0] / size[0], max_size[1] / size[1])
+            return (int(size[0] * ratio), int(size[1] * ratio))
+        return None
+    
+    def iter_previews(self, image_path, watermark_text, modes, preview_size,
+                      photographer_name=None, relative_path=None):
+        """Yield (mode, image) previews of how image_path will be watermarked, without writing files.
+        
+        The overlay is drawn by the same code as the real outputs and at the
+        output size, so text, pattern and logo keep their real proportions; only
+        the photo underneath is decoded at reduced size (JPEG DCT scaling or box
+        reduction) before each result is scaled down to fit within preview_size.
+        The decoded photo is kept for the next few previews of the same file, so
+        changing the text or logo only redraws the overlay. Stop iterating to
+        skip the remaining modes.
+        """
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns, tuple(preview_size))
+        cached = self._preview_base_cache.get(key)
+        if cached is None:
+            with Image.open(image_path) as img:
+                output_size = self._bounded_size(img.size) or img.size
+                ratio = min(preview_size[0] / output_size[0], preview_size[1] / output_size[1], 1)
+                shown_size = (max(1, int(output_size[0] * ratio)), max(1, int(output_size[1] * ratio)))
+                
+                img, _ = self._decode_near_size(img, shown_size)
+                img = img.convert('RGBA' if img.has_transparency_data else 'RGB')
+                base = img.resize(output_size, Image.Resampling.BILINEAR)
+            cached = (base, shown_size)
+            self._preview_base_cache.put(key, cached)
+        base, shown_size = cached
+        
+        attribution = self.get_attribution(image_path, relative_path)
+        for index, mode in enumerate(modes):
+            rendered = self._render_overlay(base, watermark_text, attribution, photographer_name, mode,
+                                            image_path)
+            yield mode, rendered.resize(shown_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    
+    def _load_base_image(self, image_path, source=None):
+        """Decode an image, shrink it to the output bounds and convert it to RGB or RGBA.
+        
+        Sources with transparency become RGBA. Opaque sources become RGB when
+        rgb_native is set (compositing then works on RGBA strips), which avoids
+        the full-frame RGBA conversions and the RGBA round trip for JPEG output.
+        The file is read from image_path unless its contents are given as source.
+        Returns the image, its original size and a dict describing the
+        decode-time downscale that was applied ('method' and integer 'scale').
+        """
+        with Image.open(io.BytesIO(source) if source is not None else image_path) as img:
+            original_size = img.size
+            decode_info = {'method': 'none', 'scale': 1}
+            new_size = self._bounded_size(img.size)
+            has_alpha = not self.rgb_native or img.has_transparency_data
+            
+            with self._stage('decode', image_path) as stage:
+                if new_size:
+                    img, decode_info = self._decode_near_size(img, new_size)
+                img.load()
+                if self.stage_hook is not None:
+                    stage.bytes = len(source) if source is not None else os.path.getsize(image_path)
+            
+            # Resize if image is too large
+            if new_size:
+                with self._stage('resize', image_path) as stage:
+                    img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+                    stage.bytes = img.width * img.height * len(img.getbands())
+            
+            # An alpha channel that is fully opaque carries no transparency
+            if has_alpha and self.rgb_native and img.mode == 'RGBA':
+                has_alpha = img.getchannel('A').getextrema()[0] < 255
+            
+            target_mode = 'RGBA' if has_alpha else 'RGB'
+            if img.mode != target_mode:
+                with self._stage('convert', image_path) as stage:
+                    img = img.convert(target_mode)
+                    stage.bytes = img.width * img.height * len(target_mode)
+            
+            # Make sure pixel data is in memory before the file is closed
+            img.load()
+            
+        return img, original_size, decode_info
+    
+    def _decode_near_size(self, img, target_size):
+        """Let a JPEG decode at a reduced DCT scale that stays well above target_size.
+        
+        Like Image.thumbnail, the draft asks for DECODE_REDUCING_GAP times the
+        target, so the final LANCZOS resize always has at least that much detail
+        to work from. Other formats are left to the resize, whose reducing_gap
+        does the integer box reduction in every mode it supports.
+        """
+        if img.format == 'JPEG':
+            original_width = img.width
+            img.draft(img.mode, (int(target_size[0] * DECODE_REDUCING_GAP),
+                                 int(target_size[1] * DECODE_REDUCING_GAP)))
+            if img.width < original_width:
+                return img, {'method': 'jpeg_draft', 'scale': original_width // img.width}
+        
+        return img, {'method': 'none', 'scale': 1}
+    
+    def _render_overlay(self, img, watermark_text, attribution, photographer_name, watermark_mode,
+                        image_path=None, in_place=False):
+        """Draw the attribution overlay for one mode and composite it onto the base image.
+        
+        With in_place the overlay is composited onto img itself instead of a copy.
+        """
+        overlays = self._build_overlays(img.size, watermark_text, attribution, photographer_name,
+                                        watermark_mode, image_path)
+        
+        result = img if in_place else img.copy()
+        self._apply_overlays(result, overlays, image_path)
+        return result
+    
+    def _build_overlays(self, img_size, watermark_text, attribution, photographer_name, watermark_mode,
+                        image_path=None):
+        """Draw the attribution overlay for one mode as a list of (origin, RGBA overlay) pairs.
+        
+        The watermarked pattern covers the whole frame, so that mode returns a
+        single full-frame overlay. In normal mode only the text block and logo
+        regions are allocated; the rest of the frame is left unchanged, which
+        gives the same pixels because fully transparent overlay pixels leave the
+        base untouched. The overlays depend only on the frame size, so one set can
+        be composited onto every frame of an animation.
+        """
+        width, height = img_size
+        margin = max(15, width // 80)
+        
+        # Resize logo based on mode
+        with self._stage('logo', image_path):
+            logo_resized = self.resize_logo(img_size, watermark_mode)
+        
+        with self._stage('layout', image_path):
+            text_items = self._layout_attribution(img_size, margin, watermark_text, 
+                                                  attribution, photographer_name)
+        
+        logo_box = None
+        if logo_resized:
+            logo_x = width - logo_resized.width - margin
+            logo_y = height - logo_resized.height - margin
+            logo_box = (logo_x, logo_y, logo_x + logo_resized.width, logo_y + logo_resized.height)
+        
+        if watermark_mode == 'watermarked':
+            regions = [(0, 0, width, height)]
+        else:
+            regions = self._overlay_regions(img_size, [item[4] for item in text_items], logo_box)
+        
+        overlays = []
+        for region in regions:
+            # Add diagonal pattern for watermarked mode, drawing the text onto a copy
+            # of the cached full-frame pattern layer
+            if watermark_mode == 'watermarked':
+                with self._stage('pattern', image_path):
+                    overlay = self._get_pattern_layer(img_size, watermark_text, logo_resized,
+                                                      watermark_mode).copy()
+            else:
+                overlay = Image.new('RGBA', (region[2] - region[0], region[3] - region[1]), (255, 255, 255, 0))
+            
+            with self._stage('text', image_path):
+                self._draw_text_items(overlay, text_items, region)
+            
+            # Add logo
+            if logo_box and self._boxes_overlap(logo_box, region):
+                overlay.paste(logo_resized, (logo_box[0] - region[0], logo_box[1] - region[1]), 
+                              logo_resized)
+            
+            overlays.append(((region[0], region[1]), overlay))
+        
+        return overlays
+    
+    def _get_pattern_layer(self, img_size, watermark_text, logo_resized, watermark_mode):
+        """Full-frame overlay holding only the diagonal pattern (with its faint logos).
+        
+        It depends on the output size, watermark text, logo and mode but not on
+        the attribution, so images of the same output size share one layer.
+        Callers draw on a copy; the cached layer itself must not be modified.
+        """
+        key = (tuple(img_size), watermark_text, self._logo_version if logo_resized else None, watermark_mode)
+        layer = self._overlay_cache.get(key)
+        if layer is None:
+            layer = Image.new('RGBA', tuple(img_size), (255, 255, 255, 0))
+            self.add_diagonal_pattern(layer, img_size, watermark_text, logo_resized)
+            self._overlay_cache.put(key, layer, layer.width * layer.height * 4)
+        return layer
+    
+    def _apply_overlays(self, base, overlays, image_path=None):
+        """Composite (origin, overlay) pairs from _build_overlays onto base in place"""
+        for origin, overlay in overlays:
+            with self._stage('composite', image_path) as stage:
+                stage.bytes = overlay.width * overlay.height * 4
+                self._composite_onto(base, overlay, origin)
+    
+    def _composite_onto(self, base, overlay, origin):
+        """Alpha-composite an RGBA overlay onto an RGB or RGBA base in place, strip by strip.
+        
+        RGB strips are composited as opaque RGBA and converted back, which gives
+        the same pixels as compositing an RGBA copy of the whole frame.
+        """
+        for top in range(0, overlay.height, COMPOSITE_STRIP_ROWS):
+            bottom = min(overlay.height, top + COMPOSITE_STRIP_ROWS)
+            strip_overlay = overlay.crop((0, top, overlay.width, bottom))
+            box = (origin[0], origin[1] + top, origin[0] + overlay.width, origin[1] + bottom)
+            
+            if base.mode == 'RGBA':
+                base.alpha_composite(strip_overlay, box[:2])
+            else:
+                strip = Image.alpha_composite(base.crop(box).convert('RGBA'), strip_overlay)
+                base.paste(strip.convert(base.mode), box)
+    
+    def _overlay_regions(self, img_size, text_boxes, logo_box):
+        """Boxes (clipped to the image) that together cover everything drawn in normal mode.
+        
+        The text block and the logo get a region each, merged into one when they
+        overlap so that drawing order inside the shared area is preserved.
+        """
+        boxes = []
+        if text_boxes:
+            boxes.append((min(box[0] for box in text_boxes), min(box[1] for box in text_boxes),
+                          max(box[2] for box in text_boxes), max(box[3] for box in text_boxes)))
+        if logo_box:
+            boxes.append(logo_box)
+        if len(boxes) == 2 and self._boxes_overlap(boxes[0], boxes[1]):
+            boxes = [(min(boxes[0][0], boxes[1][0]), min(boxes[0][1], boxes[1][1]),
+                      max(boxes[0][2], boxes[1][2]), max(boxes[0][3], boxes[1][3]))]
+        
+        regions = []
+        for box in boxes:
+            clipped = (max(0, box[0]), max(0, box[1]), min(img_size[0], box[2]), min(img_size[1], box[3]))
+            if clipped[0] < clipped[2] and clipped[1] < clipped[3]:
+                regions.append(clipped)
+        return regions
+    
+    @staticmethod
+    def _boxes_overlap(a, b):
+        return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+    
+    def _draw_text_items(self, overlay, text_items, region):
+        """Draw laid-out text items onto an overlay whose top-left sits at region[:2]"""
+        draw = ImageDraw.Draw(overlay)
+        for (x, y), text, fill, font, bbox in text_items:
+            if self._boxes_overlap(bbox, region):
+                draw.text((x - region[0], y - region[1]), text, fill=fill, font=font)
+    
+    def _get_measure_draw(self):
+        """Scratch RGBA ImageDraw used only for text measurement"""
+        if self._measure_draw is None:
+            self._measure_draw = ImageDraw.Draw(Image.new('RGBA', (1, 1)))
+        return self._measure_draw
+    
+    def _layout_attribution(self, img_size, margin, watermark_text, attribution, photographer_name):
+        """Lay out the photographer, caption and team name lines up from the bottom-left corner.
+        
+        Returns the lines in drawing order as (xy, text, fill, font, bbox) tuples,
+        where bbox is the area the text covers in image coordinates. Layouts are
+        memoized, so both variants of an image and images of the same size sharing
+        a team name and caption reuse one.
+        """
+        photographer_text = photographer_name or attribution.get('photographer', '')
+        caption_text = attribution.get('caption', '')
+        team_name = attribution.get('team_name', watermark_text)
+        main_watermark = team_name or watermark_text
+        
+        key = (tuple(img_size), margin, photographer_text, caption_text, main_watermark)
+        items = self._attribution_layout_cache.get(key)
+        if items is None:
+            items = self._compute_attribution_layout(img_size, margin, photographer_text, 
+                                                     caption_text, main_watermark)
+            self._attribution_layout_cache.put(key, items)
+        return items
+    
+    def _compute_attribution_layout(self, img_size, margin, photographer_text, caption_text, main_watermark):
+        img_width, img_height = img_size
+        items = []
+        
+        def add_text(xy, text, fill, font):
+            bbox = self.get_text_layout(text, font)['bbox']
+            items.append((xy, text, fill, font, 
+                          (bbox[0] + xy[0], bbox[1] + xy[1], bbox[2] + xy[0], bbox[3] + xy[1])))
+        
+        # Fonts for different elements
+        watermark_font = self.get_font(max(16, img_width // 60))
+        caption_font = self.get_font(max(12, img_width // 80))
+        photographer_font = self.get_font(max(10, img_width // 90))
+        
+        # Position elements from bottom up
+        current_y = img_height - margin
+        
+        # Add photographer info if available
+        if photographer_text:
+            if photographer_font:
+                bbox = self.get_text_layout(f"Photo: {photographer_text}", photographer_font)['bbox']
+                text_height = bbox[3] - bbox[1]
+            else:
+                text_height = 12
+            
+            current_y -= text_height
+            add_text((margin, current_y), f"Photo: {photographer_text}", 
+                     (255, 255, 255, 200), photographer_font)
+            current_y -= 5  # Small gap
+        
+        # Add caption if available
+        if caption_text:
+            # Word wrap caption if too long
+            max_caption_width = img_width - 2 * margin
+            if caption_font:
+                layout = self.get_text_layout(caption_text, caption_font, max_caption_width)
+                bbox = layout['bbox']
+                text_height = bbox[3] - bbox[1]
+                lines = layout['lines']
+            else:
+                text_height = 14
+                lines = [caption_text]
+                if len(caption_text) * 8 > max_caption_width:
+                    lines = self._wrap_text(caption_text, max_caption_width, None, None)
+            
+            # Draw the (possibly wrapped) caption
+            for i, line in enumerate(reversed(lines)):
+                current_y -= text_height
+                add_text((margin, current_y), line, (255, 255, 255, 220), caption_font)
+                if i < len(lines) - 1:
+                    current_y -= 2  # Line spacing
+            
+            current_y -= 8  # Gap before main watermark
+        
+        # Add main watermark text
+        if watermark_font:
+            bbox = self.get_text_layout(main_watermark, watermark_font)['bbox']
+            text_height = bbox[3] - bbox[1]
+        else:
+            text_height = 18
+        
+        current_y -= text_height
+        add_text((margin, current_y), main_watermark, (255, 255, 255, 255), watermark_font)
+        return tuple(items)
+    
+    def get_text_layout(self, text, font, max_width=None):
+        """Measure text once per (text, font, size, max width) and wrap it to max_width.
+        
+        Returns a dict with 'bbox' (the text's bounding box drawn at (0, 0)) and
+        'lines' (the text wrapped at word boundaries to fit max_width, or the text
+        itself when it fits or max_width is None).
+        """
+        key = (text, getattr(font, 'path', None), getattr(font, 'size', None), max_width)
+        layout = self._text_layout_cache.get(key)
+        if layout is not None:
+            return layout
+        
+        draw = self._get_measure_draw()
+        bbox = draw.textbbox((0, 0), text, font=font)
+        lines = (text,)
+        if max_width is not None and bbox[2] - bbox[0] > max_width:
+            lines = tuple(self._wrap_text(text, max_width, font, draw))
+        
+        layout = {'bbox': bbox, 'lines': lines}
+        self._text_layout_cache.put(key, layout)
+        return layout
     
     def _wrap_text(self, text, max_width, font, draw):
-        """Helper method to wrap text to fit within specified width"""
+        """Helper method to wrap text to fit within specified width.
+        
+        Each word is measured once with getlength and line widths are summed, so
+        wrapping is linear in the length of the text. Only when a sum lands within
+        a font size of max_width is the candidate line measured exactly with
+        textbbox, which keeps the breaks identical to measuring every prefix.
+        """
         words = text.split()
         lines = []
         current_line = []
+        current_width = 0
+        
+        if font:
+            space_width = font.getlength(' ')
+            slack = getattr(font, 'size', 0) or 16
         
         for word in words:
-            test_line = ' '.join(current_line + [word])
             if font:
-                test_bbox = draw.textbbox((0, 0), test_line, font=font)
-                test_width = test_bbox[2] - test_bbox[0]
+                word_width = font.getlength(word)
+                test_width = current_width + space_width + word_width if current_line else word_width
+                if test_width <= max_width - slack:
+                    fits = True
+                elif test_width > max_width + slack:
+                    fits = False
+                else:
+                    test_bbox = draw.textbbox((0, 0), ' '.join(current_line + [word]), font=font)
+                    fits = test_bbox[2] - test_bbox[0] <= max_width
             else:
-                test_width = len(test_line) * 8
+                word_width = len(word) * 8
+                test_width = current_width + 8 + word_width if current_line else word_width
+                fits = test_width <= max_width
             
-            if test_width <= max_width:
+            if fits or not current_line:
                 current_line.append(word)
+                current_width = test_width
             else:
-                if current_line:
-                    lines.append(' '.join(current_line))
+                lines.append(' '.join(current_line))
                 current_line = [word]
+                current_width = word_width
         
         if current_line:
             lines.append(' '.join(current_line))
@@ -356,33 +1149,62 @@ class WatermarkProcessor:
     def log_attribution(self, log_path, input_path, output_path, attribution, 
                        photographer_name, subfolder_name, original_size, final_size):
         """Log processing details to CSV file"""
+        row = self.build_log_row(input_path, output_path, attribution, photographer_name,
+                                 subfolder_name, original_size, final_size)
+        self.append_log_rows(log_path, [row])
+    
+    def build_log_row(self, input_path, output_path, attribution, 
+                      photographer_name, subfolder_name, original_size, final_size):
+        """Build one attribution log row without writing it"""
+        size_changed = original_size != final_size
+        
+        return {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'input_file': os.path.basename(input_path),
+            'output_file': os.path.basename(output_path),
+            'subfolder': subfolder_name or '',
+            'team_name': attribution.get('team_name', ''),
+            'caption': attribution.get('caption', ''),
+            'photographer': photographer_name or attribution.get('photographer', ''),
+            'original_size': f"{original_size[0]}x{original_size[1]}",
+            'final_size': f"{final_size[0]}x{final_size[1]}",
+            'size_changed': size_changed
+        }
+    
+    def open_log_writer(self, log_path, **writer_options):
+        """Keep a log file open for buffered appends until close_log_writers is called"""
+        key = os.path.abspath(log_path)
+        if key not in self._log_writers:
+            self._log_writers[key] = AttributionLogWriter(log_path, **writer_options)
+        return self._log_writers[key]
+    
+    def close_log_writers(self):
+        """Flush and close every open log writer"""
+        writers = list(self._log_writers.values())
+        self._log_writers.clear()
+        for writer in writers:
+            try:
+                writer.close()
+            except Exception as e:
+                print(f"Error closing attribution log {writer.log_path}: {e}")
+    
+    def append_log_rows(self, log_path, rows):
+        """Append already built rows to an attribution log CSV file"""
+        writer = self._log_writers.get(os.path.abspath(log_path))
+        if writer:
+            writer.write_rows(rows)
+            return
+        
         try:
             file_exists = os.path.exists(log_path)
             
             with open(log_path, 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['timestamp', 'input_file', 'output_file', 'subfolder', 
-                             'team_name', 'caption', 'photographer', 'original_size', 
-                             'final_size', 'size_changed']
-                
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=LOG_FIELDNAMES)
                 
                 if not file_exists:
                     writer.writeheader()
                 
-                size_changed = original_size != final_size
-                
-                writer.writerow({
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'input_file': os.path.basename(input_path),
-                    'output_file': os.path.basename(output_path),
-                    'subfolder': subfolder_name or '',
-                    'team_name': attribution.get('team_name', ''),
-                    'caption': attribution.get('caption', ''),
-                    'photographer': photographer_name or attribution.get('photographer', ''),
-                    'original_size': f"{original_size[0]}x{original_size[1]}",
-                    'final_size': f"{final_size[0]}x{final_size[1]}",
-                    'size_changed': size_changed
-                })
+                writer.writerows(rows)
                 
         except Exception as e:
             print(f"Error logging attribution: {e}")
@@ -433,8 +1255,8 @@ class WatermarkProcessor:
     
     def clear_attribution_data(self):
         """Clear loaded attribution data"""
-        self.attribution_data.clear()
+        self.attributions.clear()
     
     def get_attribution_count(self):
         """Get count of loaded attribution entries"""
-        return len(self.attribution_data)
\ No newline at end of file
+        return len(self.attributions)
\ No newline at end of file
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""Local HTTP service returning watermarked images on demand.
+
+An asyncio front end accepts requests and hands rendering to a pool of worker
+processes that keep the logo, fonts and attribution data loaded, so a request
+costs only the render itself. Requests beyond the pool are queued up to
+--max-queue and turned away with 503 after that.
+
+    python watermark_service.py --logo logo.png --csv attribution.csv --port 8765
+
+    # Upload an image; attribution fields are optional (the CSV is used otherwise)
+    curl --data-binary @IMG_0001.jpg -o preview.jpg \\
+        "http://127.0.0.1:8765/watermark?filename=IMG_0001.jpg&mode=watermarked&photographer=Alice"
+
+    # Render a file under --input-root instead of uploading it
+    curl -o preview.jpg "http://127.0.0.1:8765/watermark?path=alice/IMG_0001.jpg"
+
+    curl http://127.0.0.1:8765/metrics
+
+POST /watermark takes the image as the request body; GET /watermark takes a
+path. Query parameters: mode (normal or watermarked), format (jpeg, png, webp,
+gif; defaults to the source format), filename, photographer, caption,
+team_name and text (overrides the watermark text). /metrics reports request
+counts, queue state, latency percentiles and throughput as JSON and /health
+answers once the workers are up.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlsplit
+
+from batch_processor import build_processor
+from encoder_profiles import DEFAULT_ENCODER_PROFILE, ENCODER_PROFILES, get_output_format
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_HEADER_BYTES = 64 * 1024
+HEADER_TIMEOUT = 10.0
+BODY_TIMEOUT = 60.0
+# Recent requests kept for latency percentiles, and the throughput window in seconds
+LATENCY_WINDOW = 1000
+THROUGHPUT_WINDOW = 60.0
+
+OUTPUT_EXTENSIONS = {'jpeg': '.jpg', 'jpg': '.jpg', 'png': '.png', 'webp': '.webp', 'gif': '.gif'}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+STATUS_REASONS = {
+    200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 422: 'Unprocessable Entity',
+    431: 'Request Header Fields Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+# Per-process processor, created once by the pool initializer
+_service_processor = None
+
+
+def _init_service_worker(settings):
+    """Pool initializer: load shared assets once per worker process"""
+    global _service_processor
+    # Shutdown is driven by the front end, which lets requests in progress finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _service_processor = build_processor(settings)
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _render_request(job):
+    """Render one request inside a worker process and return the encoded bytes"""
+    start_time = time.perf_counter()
+    variant = {'mode': job['mode'], 'output_path': 'preview' + job['extension'], 'log_path': None}
+    result = _service_processor.render_variants(job['image_path'], [variant], job['watermark_text'],
+                                                job['photographer'], source=job['source'],
+                                                encode_only=True, relative_path=job['relative_path'],
+                                                attribution=job['attribution'])[0]
+    return {
+        'success': result['success'],
+        'data': result.get('data'),
+        'error': result.get('error', ''),
+        'render_time': time.perf_counter() - start_time
+    }
+
+
+class HTTPError(Exception):
+    """An error answered with its status code and a JSON message"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class ServiceMetrics:
+    """Request counters plus recent latencies and completion times for /metrics"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.statuses = {}
+        self.rejected = 0
+        self.bytes_out = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._render_times = deque(maxlen=LATENCY_WINDOW)
+        self._completed = deque()
+
+    def record(self, status, latency, render_time=None, bytes_out=0):
+        now = time.monotonic()
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes_out += bytes_out
+        self._latencies.append(latency)
+        if render_time is not None:
+            self._render_times.append(render_time)
+        if status == 200:
+            self._completed.append(now)
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._completed and now - self._completed[0] > THROUGHPUT_WINDOW:
+            self._completed.popleft()
+
+    def snapshot(self):
+        now = time.monotonic()
+        self._trim(now)
+        uptime = now - self.started
+        return {
+            'uptime_s': uptime,
+            'requests': self.requests,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'bytes_out': self.bytes_out,
+            'throughput_rps': len(self._completed) / max(1e-9, min(uptime, THROUGHPUT_WINDOW)),
+            'latency_ms': self._distribution(self._latencies),
+            'render_ms': self._distribution(self._render_times)
+        }
+
+    @staticmethod
+    def _distribution(values):
+        if not values:
+            return {'count': 0}
+        ordered = sorted(values)
+        return {
+            'count': len(ordered),
+            'mean': sum(ordered) / len(ordered) * 1000,
+            'p50': _percentile(ordered, 0.50) * 1000,
+            'p95': _percentile(ordered, 0.95) * 1000,
+            'p99': _percentile(ordered, 0.99) * 1000,
+            'max': ordered[-1] * 1000
+        }
+
+
+class WatermarkService:
+    """HTTP front end for a warm pool of watermarking worker processes.
+
+    settings are the BatchProcessor processor settings (logo_path, csv_path,
+    font_path, encoder_profile, ...). At most `workers` renders run at once and
+    up to max_queue more wait for a worker; later requests get 503. Uploads
+    are limited to max_upload_mb, and paths are only accepted when input_root
+    is set and must stay inside it.
+
+    Use start() and close() from a running event loop (start() returns the
+    bound port, so port=0 picks a free one for tests), or serve() to run until
+    SIGINT/SIGTERM.
+    """
+
+    def __init__(self, settings, watermark_text, workers=None, max_queue=None,
+                 max_upload_mb=50, input_root=None):
+        self.settings = dict(settings)
+        self.watermark_text = watermark_text
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_queue = max_queue if max_queue is not None else 4 * self.workers
+        self.max_upload_bytes = int(max_upload_mb * 1024 * 1024)
+        self.input_root = os.path.realpath(input_root) if input_root else None
+        self.metrics = ServiceMetrics()
+
+        self._executor = None
+        self._server = None
+        self._render_slots = None
+        self._ready = False
+        self._closing = False
+        # Connection handler task -> its writer, and the handlers answering a request
+        self._connections = {}
+        self._busy = set()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Start the workers and begin accepting connections; returns the bound port"""
+        self._render_slots = asyncio.Semaphore(self.workers)
+        self._executor = self._new_executor()
+        await self._warm_up()
+        self._server = await asyncio.start_server(self._handle_connection, host, port,
+                                                  limit=MAX_HEADER_BYTES)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        """Stop accepting connections, finish the requests in progress, then shut the workers down"""
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections are closed; busy ones close after their response
+            for task, writer in list(self._connections.items()):
+                if task not in self._busy:
+                    writer.close()
+            if self._connections:
+                await asyncio.wait(list(self._connections), timeout=BODY_TIMEOUT)
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+        self._ready = False
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Serve until SIGINT or SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on Windows event loops; Ctrl+C still interrupts serve()
+                pass
+
+        port = await self.start(host, port)
+        print(f"Watermark service listening on http://{host}:{port} with {self.workers} worker(s)")
+        try:
+            await stop.wait()
+        finally:
+            print("Shutting down...")
+            await self.close()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_service_worker,
+                                   initargs=(self.settings,))
+
+    async def _warm_up(self):
+        """Run a trivial task per worker so the first requests don't pay for loading assets"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _worker_ready)
+                               for _ in range(self.workers)))
+        self._ready = True
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while not self._closing:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_error(writer, e, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                self._busy.add(task)
+                keep_alive = request['keep_alive'] and not self._closing
+                try:
+                    status, headers, body = await self._dispatch(request)
+                except HTTPError as e:
+                    await self._send_error(writer, e, keep_alive)
+                except Exception as e:
+                    print(f"Error handling {request['path']}: {e}")
+                    await self._send_error(writer, HTTPError(500, f"internal error: {e}"), keep_alive=False)
+                    break
+                else:
+                    await self._send(writer, status, headers, body, keep_alive)
+                self._busy.discard(task)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._busy.discard(task)
+            self._connections.pop(task, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        """Read one request; returns None when the client closed the connection"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "request headers too large")
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, "chunked uploads are not supported, send a Content-Length")
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise HTTPError(400, "invalid Content-Length")
+        if length < 0:
+            raise HTTPError(400, "invalid Content-Length")
+        if length > self.max_upload_bytes:
+            raise HTTPError(413, f"upload larger than {self.max_upload_bytes} bytes")
+        body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT) if length else b''
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return {'method': method.upper(), 'path': url.path, 'query': query, 'headers': headers,
+                'body': body, 'keep_alive': keep_alive}
+
+    async def _dispatch(self, request):
+        path = request['path'].rstrip('/') or '/'
+        if path == '/metrics':
+            return 200, {'Content-Type': 'application/json'}, self._metrics_body()
+        if path == '/health':
+            if not self._ready:
+                raise HTTPError(503, "workers are starting")
+            return 200, {'Content-Type': 'application/json'}, b'{"status": "ok"}'
+        if path != '/watermark':
+            raise HTTPError(404, f"no such endpoint: {request['path']}")
+        if request['method'] not in ('GET', 'POST'):
+            raise HTTPError(405, "use POST with an image body or GET with a path",
+                            {'Allow': 'GET, POST'})
+
+        start_time = time.perf_counter()
+        try:
+            job = self._build_job(request)
+            result = await self._render(job)
+        except HTTPError as e:
+            self.metrics.record(e.status, time.perf_counter() - start_time)
+            raise
+
+        latency = time.perf_counter() - start_time
+        if not result['success']:
+            self.metrics.record(422, latency, result['render_time'])
+            raise HTTPError(422, f"could not watermark image: {result['error']}")
+
+        self.metrics.record(200, latency, result['render_time'], len(result['data']))
+        output_format = get_output_format('preview' + job['extension'])
+        headers = {
+            'Content-Type': CONTENT_TYPES.get(output_format, 'application/octet-stream'),
+            'X-Render-Ms': f"{result['render_time'] * 1000:.1f}"
+        }
+        return 200, headers, result['data']
+
+    def _build_job(self, request):
+        """Turn request parameters into a picklable render job"""
+        query = request['query']
+        mode = query.get('mode', 'normal')
+        if mode not in ('normal', 'watermarked'):
+            raise HTTPError(400, "mode must be 'normal' or 'watermarked'")
+
+        relative_path = None
+        source = None
+        if request['method'] == 'POST':
+            if not request['body']:
+                raise HTTPError(400, "POST the image as the request body")
+            source = request['body']
+            image_path = os.path.basename(query.get('filename') or 'upload')
+            relative_path = query.get('filename')
+        else:
+            relative_path = query.get('path')
+            if not relative_path:
+                raise HTTPError(400, "GET needs a 'path' parameter; POST uploads instead")
+            image_path = self._resolve_path(relative_path)
+
+        source_extension = os.path.splitext(image_path)[1].lower()
+        requested_format = query.get('format', '').lower()
+        if requested_format:
+            if requested_format not in OUTPUT_EXTENSIONS:
+                raise HTTPError(400, f"format must be one of: {', '.join(sorted(OUTPUT_EXTENSIONS))}")
+            extension = OUTPUT_EXTENSIONS[requested_format]
+        elif get_output_format(image_path) in CONTENT_TYPES:
+            extension = source_extension
+        else:
+            extension = '.jpg'
+
+        # Explicit attribution fields replace the CSV row for this image
+        attribution = None
+        if any(field in query for field in ('caption', 'team_name')):
+            attribution = {field: query.get(field, '') for field in ('team_name', 'caption', 'photographer')}
+
+        return {
+            'image_path': image_path,
+            'relative_path': relative_path,
+            'source': source,
+            'mode': mode,
+            'extension': extension,
+            'watermark_text': query.get('text') or self.watermark_text,
+            'photographer': query.get('photographer'),
+            'attribution': attribution
+        }
+
+    def _resolve_path(self, relative_path):
+        if not self.input_root:
+            raise HTTPError(403, "rendering by path is disabled; start the service with --input-root")
+        full_path = os.path.realpath(os.path.join(self.input_root, relative_path))
+        if os.path.commonpath([full_path, self.input_root]) != self.input_root:
+            raise HTTPError(403, "path is outside the input root")
+        if not os.path.isfile(full_path):
+            raise HTTPError(404, f"no such image: {relative_path}")
+        return full_path
+
+    async def _render(self, job):
+        """Run a job on the pool, waiting for a free worker if the queue has room"""
+        metrics = self.metrics
+        if metrics.waiting >= self.max_queue and self._render_slots.locked():
+            metrics.rejected += 1
+            raise HTTPError(503, "too many requests waiting, retry shortly", {'Retry-After': '1'})
+
+        metrics.waiting += 1
+        try:
+            await self._render_slots.acquire()
+        finally:
+            metrics.waiting -= 1
+
+        metrics.in_flight += 1
+        executor = self._executor
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, _render_request, job)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); release the broken pool's processes and
+            # start a fresh one for later requests, once for all requests it failed
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            raise HTTPError(500, "a worker process crashed while rendering")
+        finally:
+            metrics.in_flight -= 1
+            self._render_slots.release()
+
+    def _metrics_body(self):
+        snapshot = self.metrics.snapshot()
+        snapshot['workers'] = self.workers
+        snapshot['max_queue'] = self.max_queue
+        return json.dumps(snapshot, indent=2).encode('utf-8')
+
+    async def _send(self, writer, status, headers, body, keep_alive):
+        lines = [f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}"]
+        headers = dict(headers, **{'Content-Length': str(len(body)),
+                                   'Connection': 'keep-alive' if keep_alive else 'close'})
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_error(self, writer, error, keep_alive):
+        body = json.dumps({'error': str(error)}).encode('utf-8')
+        await self._send(writer, error.status, dict(error.headers, **{'Content-Type': 'application/json'}),
+                         body, keep_alive)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='triyog-watermark-service',
+        description="Serve watermarked images over HTTP from a warm pool of worker processes.")
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help="address to listen on (default: %(default)s, local only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument('-t', '--text', default='PNJWEW2025',
+                        help="watermark text (default: %(default)s)")
+    parser.add_argument('--logo', help="logo image (PNG recommended)")
+    parser.add_argument('--csv', help="attribution CSV looked up by the 'filename' or 'path' parameter")
+    parser.add_argument('--font', help="font file to use instead of probing system fonts")
+    parser.add_argument('--profile', choices=sorted(ENCODER_PROFILES), default=DEFAULT_ENCODER_PROFILE,
+                        help="per-format save settings to use (default: %(default)s)")
+    parser.add_argument('--workers', type=int,
+                        help="render worker processes (default: one per CPU)")
+    parser.add_argument('--max-queue', type=int,
+                        help="requests allowed to wait for a worker before answering 503 "
+                             "(default: 4 per worker)")
+    parser.add_argument('--max-upload-mb', type=float, default=50,
+                        help="largest accepted upload (default: %(default)s)")
+    parser.add_argument('--input-root',
+                        help="folder that GET /watermark?path=... may read from (default: disabled)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_queue is not None and args.max_queue < 0:
+        parser.error("--max-queue must not be negative")
+    if args.input_root and not os.path.isdir(args.input_root):
+        parser.error(f"input root does not exist: {args.input_root}")
+
+    settings = {
+        'logo_path': args.logo,
+        'csv_path': args.csv,
+        'font_path': args.font,
+        'encoder_profile': args.profile,
+        # Each request renders on a single worker process
+        'frame_threads': 1
+    }
+    service = WatermarkService(settings, args.text, workers=args.workers, max_queue=args.max_queue,
+                               max_upload_mb=args.max_upload_mb, input_root=args.input_root)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())